@@ -0,0 +1,395 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import config
+import document_loaders
+import rag_handler
+import vector_store_manager
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+}
+
+# Request paths counted under their own metrics label; anything else is "other"
+ROUTES = ("/status", "/metrics", "/ingest", "/query")
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class RagService:
+    """
+    Async front for vector_store_manager and rag_handler. Blocking work runs
+    in a thread pool; identical requests that arrive while one is already
+    running share its result instead of repeating the work.
+    """
+
+    def __init__(self, llm, logger=print):
+        self.llm = llm
+        self.logger = logger
+        self.executor = ThreadPoolExecutor(max_workers=config.API_WORKER_THREADS)
+        self.documents = {}  # document_id -> {"name", "path", "vectordb", "full_text"}
+        self.in_flight = {}  # request key -> {"future", "listeners"}
+        self.metrics = Counter()
+        self.started = time.time()
+
+    async def _coalesced(self, key, work, listener=None):
+        """
+        Runs work(logger) in the thread pool unless an identical request is
+        already in flight, in which case its result is awaited instead.
+        Log lines are forwarded to every listener queue attached to the key.
+        """
+        entry = self.in_flight.get(key)
+        if entry is not None:
+            self.metrics["coalesced_total"] += 1
+            if listener is not None:
+                entry["listeners"].append(listener)
+            return await asyncio.shield(entry["future"])
+
+        loop = asyncio.get_running_loop()
+        entry = {"future": loop.create_future(), "listeners": [listener] if listener else []}
+        self.in_flight[key] = entry
+
+        def logger(message):
+            self.logger(message)
+            for queue in list(entry["listeners"]):
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+
+        try:
+            result = await loop.run_in_executor(self.executor, work, logger)
+        except Exception as e:
+            entry["future"].set_exception(e)
+            entry["future"].exception()  # Mark as retrieved when nobody else is waiting
+            raise
+        else:
+            entry["future"].set_result(result)
+            return result
+        finally:
+            del self.in_flight[key]
+
+    async def ingest(self, pdf_path, listener=None, name=None):
+        """
+        Loads (or builds) the vector store for a document, directory or archive
+        and registers it. Requests are coalesced on the content hash, so two
+        paths with the same content share one build.
+        """
+        if not os.path.exists(pdf_path):
+            raise HttpError(400, f"File not found: {pdf_path}")
+
+        loop = asyncio.get_running_loop()
+        document_id = await loop.run_in_executor(self.executor, vector_store_manager.get_source_hash, pdf_path)
+
+        def work(logger):
+            if document_id not in self.documents:
+                self.documents[document_id] = {
+                    "name": name or os.path.basename(pdf_path),
+                    "path": pdf_path,
+                    "vectordb": vector_store_manager.load_or_create_vector_store(pdf_path, logger=logger),
+                    "full_text": vector_store_manager.load_full_text(pdf_path, logger=logger),
+                }
+            return {"document_id": document_id, "name": self.documents[document_id]["name"]}
+
+        return await self._coalesced(("ingest", document_id), work, listener)
+
+    async def query(self, document_id, question, listener=None):
+        """Answers a question about a registered document."""
+        document = self.documents.get(document_id)
+        if document is None:
+            raise HttpError(404, f"Unknown document_id: {document_id}")
+
+        def work(logger):
+            answer, sources = rag_handler.get_rag_response(
+                question, document["vectordb"], self.llm, document["full_text"], logger=logger
+            )
+            return {
+                "answer": answer,
+                "sources": [{"page_content": d.page_content, "metadata": d.metadata} for d in sources],
+            }
+
+        key = ("query", document_id, " ".join(question.lower().split()))
+        started = time.perf_counter()
+        result = await self._coalesced(key, work, listener)
+        self.metrics["query_seconds_total"] += time.perf_counter() - started
+        self.metrics["queries_total"] += 1
+        return result
+
+    def status(self):
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "model_backend": config.MODEL_BACKEND,
+            "documents": [
+                {"document_id": document_id, "name": doc["name"]}
+                for document_id, doc in self.documents.items()
+            ],
+            "in_flight": len(self.in_flight),
+        }
+
+class ApiServer:
+    """
+    Minimal HTTP/1.1 JSON server over asyncio streams with keep-alive.
+    Endpoints:
+      POST /ingest   {"path": "..."} or a raw document body with ?name=file.ext
+      POST /query    {"document_id": "...", "question": "...", "stream": false}
+      GET  /status
+      GET  /metrics
+    Streaming queries return newline-delimited JSON events over chunked encoding.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.active_by_client = Counter()
+
+    async def handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        peer_host = peer[0] if peer else "unknown"
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), config.API_KEEPALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                client = headers.get("x-client-id") or peer_host
+                await self._dispatch(method, path, query, headers, body, client, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except HttpError as e:
+            await self._send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(411, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > config.API_MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        url = urlsplit(target)
+        return method.upper(), url.path, parse_qs(url.query), headers, body
+
+    async def _dispatch(self, method, path, query, headers, body, client, writer, keep_alive):
+        metrics = self.service.metrics
+        # Unknown paths share one label so clients cannot grow the metrics without bound
+        label = path if path in ROUTES else "other"
+        metrics[f"requests_total{{path={label}}}"] += 1
+        try:
+            if path == "/status" and method == "GET":
+                return await self._send_json(writer, 200, self.service.status(), keep_alive)
+            if path == "/metrics" and method == "GET":
+                return await self._send_json(writer, 200, dict(metrics), keep_alive)
+            if path not in ("/ingest", "/query"):
+                raise HttpError(404, f"No route for {path}")
+            if method != "POST":
+                raise HttpError(405, f"{path} only accepts POST")
+
+            if self.active_by_client[client] >= config.API_MAX_CONCURRENT_PER_CLIENT:
+                metrics["rejected_total"] += 1
+                raise HttpError(429, "Too many concurrent requests for this client")
+            self.active_by_client[client] += 1
+            try:
+                if path == "/ingest":
+                    await self._handle_ingest(query, headers, body, writer, keep_alive)
+                else:
+                    await self._handle_query(body, writer, keep_alive)
+            finally:
+                self.active_by_client[client] -= 1
+                if not self.active_by_client[client]:
+                    del self.active_by_client[client]
+        except HttpError as e:
+            metrics["errors_total"] += 1
+            await self._send_json(writer, e.status, {"error": e.message}, keep_alive)
+        except Exception as e:
+            metrics["errors_total"] += 1
+            self.service.logger(f"Request to {path} failed: {e}")
+            await self._send_json(writer, 500, {"error": str(e)}, keep_alive)
+
+    async def _handle_ingest(self, query, headers, body, writer, keep_alive):
+        content_type = headers.get("content-type", "").split(";")[0].strip()
+        # Raw uploads carry ?name= or a document MIME type; anything else is a JSON {"path": ...}
+        upload_format = document_loaders.detect_format("", content_type) if content_type else None
+        if "name" in query or upload_format:
+            if "name" in query:
+                name = os.path.basename(query["name"][0])
+            else:
+                name = "upload" + document_loaders.FORMATS[upload_format]["extensions"][0]
+            if not document_loaders.detect_format(name) and not document_loaders.is_archive_name(name):
+                raise HttpError(400, f"Unsupported document type: {name}")
+            pdf_path = _save_upload(name, body)
+            try:
+                result = await self.service.ingest(pdf_path, name=name)
+            except Exception:
+                os.remove(pdf_path)
+                raise
+            # Content that was already ingested keeps its first upload
+            if self.service.documents[result["document_id"]]["path"] != pdf_path:
+                os.remove(pdf_path)
+        else:
+            pdf_path = _parse_json(body).get("path")
+            if not pdf_path:
+                raise HttpError(400, "Missing 'path'")
+            pdf_path = _resolve_ingest_path(pdf_path)
+            result = await self.service.ingest(pdf_path)
+        await self._send_json(writer, 200, result, keep_alive)
+
+    async def _handle_query(self, body, writer, keep_alive):
+        payload = _parse_json(body)
+        document_id, question = payload.get("document_id"), payload.get("question")
+        if not document_id or not question:
+            raise HttpError(400, "Missing 'document_id' or 'question'")
+
+        if not payload.get("stream"):
+            result = await self.service.query(document_id, question)
+            return await self._send_json(writer, 200, result, keep_alive)
+
+        queue = asyncio.Queue()
+        task = asyncio.create_task(self.service.query(document_id, question, listener=queue))
+        await self._start_stream(writer, keep_alive)
+        while not task.done():
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await self._send_chunk(writer, {"event": "log", "message": getter.result()})
+            else:
+                getter.cancel()
+        while not queue.empty():
+            await self._send_chunk(writer, {"event": "log", "message": queue.get_nowait()})
+        try:
+            await self._send_chunk(writer, {"event": "answer", **task.result()})
+        except HttpError as e:
+            await self._send_chunk(writer, {"event": "error", "error": e.message})
+        except Exception as e:
+            await self._send_chunk(writer, {"event": "error", "error": str(e)})
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _start_stream(self, writer, keep_alive):
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: application/x-ndjson\r\n"
+            "Transfer-Encoding: chunked\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1"))
+        await writer.drain()
+
+    async def _send_chunk(self, writer, event):
+        data = (json.dumps(event) + "\n").encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+def _resolve_ingest_path(path):
+    """
+    Resolves a client-supplied path against API_INGEST_ROOT and rejects
+    anything outside it (including via '..' or symlinks), so clients cannot
+    have arbitrary server files ingested and served back through /query.
+    """
+    if not config.API_INGEST_ROOT:
+        raise HttpError(400, "Ingesting server paths is disabled; upload the document instead")
+    root = os.path.realpath(config.API_INGEST_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HttpError(400, f"Path is outside the ingest root: {path}")
+    return resolved
+
+def _save_upload(name, body):
+    """
+    Writes an uploaded body to a new file in UPLOAD_DIRECTORY. The name is
+    made unique so concurrent uploads never overwrite each other; the full
+    extension (e.g. .tar.gz) is kept for format detection.
+    """
+    os.makedirs(config.UPLOAD_DIRECTORY, exist_ok=True)
+    stem, dot, extension = name.partition(".")
+    fd, path = tempfile.mkstemp(prefix=f"{stem}-", suffix=dot + extension, dir=config.UPLOAD_DIRECTORY)
+    with os.fdopen(fd, "wb") as f:
+        f.write(body)
+    return path
+
+def _parse_json(body):
+    try:
+        payload = json.loads(body or b"{}")
+    except json.JSONDecodeError:
+        raise HttpError(400, "Request body is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HttpError(400, "Request body must be a JSON object")
+    return payload
+
+async def serve(host, port, preload=()):
+    service = RagService(rag_handler.initialize_llm())
+    for pdf_path in preload:
+        result = await service.ingest(pdf_path)
+        print(f"Loaded {result['name']} as {result['document_id']}")
+
+    server = await asyncio.start_server(ApiServer(service).handle_connection, host, port)
+    print(f"--- Serving RAG API on http://{host}:{port} ({config.MODEL_BACKEND} models) ---")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    """Runs the HTTP API."""
+    parser = argparse.ArgumentParser(description="Serve the RAG assistant over HTTP/JSON.")
+    parser.add_argument("pdf_paths", nargs="*", help="Documents, directories or archives to ingest at startup")
+    parser.add_argument("--host", default=config.API_HOST)
+    parser.add_argument("--port", type=int, default=config.API_PORT)
+    parser.add_argument("--stub", action="store_true", help="Use offline stub models instead of Gemini")
+    args = parser.parse_args()
+    if args.stub:
+        config.MODEL_BACKEND = "stub"
+    asyncio.run(serve(args.host, args.port, args.pdf_paths))
+
+if __name__ == "__main__":
+    main()
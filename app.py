@@ -1,13 +1,12 @@
 import streamlit as st
 import time
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
 import os
 
 import config
-import vector_store_manager
-import document_processor
+import conversation_memory
+import document_loaders
 import rag_handler
+import warmup
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -345,22 +344,14 @@ st.markdown("""
 
 @st.cache_resource
 def initialize_llm():
-    """Initializes and returns the Generative AI model, cached for efficiency."""
-    load_dotenv()
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
-        st.error("🔑 GOOGLE_API_KEY not found in environment variables.")
+    """Initializes and returns the chat model, cached for efficiency."""
+    try:
+        return rag_handler.initialize_llm()
+    except ValueError as e:
+        st.error(f"🔑 {e}")
         return None
-    
-    return ChatGoogleGenerativeAI(
-        model=config.LLM_MODEL_NAME,
-        google_api_key=google_api_key,
-        temperature=0,
-        max_retries=2,
-    )
 
 # --- Initialization ---
-llm = initialize_llm()
 os.makedirs(config.UPLOAD_DIRECTORY, exist_ok=True)
 
 # --- Main App Logic ---
@@ -374,7 +365,7 @@ if "file_path" not in st.session_state:
     
     with col2:
         st.markdown("### 🚀 Get Started")
-        st.info("💡 Upload a PDF document and start asking questions powered by AI!")
+        st.info("💡 Upload a document (PDF, HTML, Markdown, reStructuredText or man page) and start asking questions powered by AI!")
         
         # Feature highlights
         with st.expander("✨ Features", expanded=True):
@@ -389,8 +380,8 @@ if "file_path" not in st.session_state:
         st.markdown("#### 📤 Upload Your Document")
         
         uploaded_file = st.file_uploader(
-            "Drop your PDF here or click to browse",
-            type="pdf",
+            "Drop your document here or click to browse",
+            type=[ext.lstrip(".") for ext in document_loaders.supported_extensions()],
             label_visibility="collapsed"
         )
 
@@ -408,6 +399,10 @@ if "file_path" not in st.session_state:
                 # Store file info in session state
                 st.session_state.file_path = file_path
                 st.session_state.file_name = uploaded_file.name
+
+                # Start opening the store, loading the text and answering the
+                # starter questions while the chat page renders
+                st.session_state.warmup = warmup.DocumentWarmup(file_path, llm=initialize_llm())
                 
                 # Rerun the app to move to the chat interface
                 st.rerun()
@@ -416,6 +411,7 @@ if "file_path" not in st.session_state:
 else:
     file_path = st.session_state.file_path
     file_name = st.session_state.file_name
+    llm = initialize_llm()
 
     # --- Sidebar to manage documents ---
     with st.sidebar:
@@ -444,6 +440,7 @@ else:
             if st.button("🗑️ Clear Chat", use_container_width=True):
                 st.session_state.messages = []
                 st.session_state.logs = []
+                st.session_state.memory = conversation_memory.ConversationMemory()
                 st.success("Chat cleared! 🧹")
                 time.sleep(0.5)
                 st.rerun()
@@ -502,17 +499,25 @@ else:
         # Print to console
         print(message)
 
+    if "warmup" not in st.session_state:
+        st.session_state.warmup = warmup.DocumentWarmup(file_path, llm=llm)
+    document_warmup = st.session_state.warmup
+
     with chat_col:
-        # Load vector store for the current file
+        # Wait for the background warm-up (instant once the store and text are loaded)
         with st.spinner(f"🔄 Processing '{file_name}'... This may take a moment on first upload."):
-            vectordb = vector_store_manager.load_or_create_vector_store(file_path, logger=ui_logger)
-            full_text = document_processor.get_full_text(file_path, logger=ui_logger)
+            vectordb = document_warmup.vector_store()
+            full_text = document_warmup.full_text()
+        for message in document_warmup.drain_logs():
+            ui_logger(message)
         
         st.success(f"✅ Ready to chat with **{file_name}**!")
         
         # Initialize chat history
         if "messages" not in st.session_state:
             st.session_state.messages = []
+        if "memory" not in st.session_state:
+            st.session_state.memory = conversation_memory.ConversationMemory()
         
         # Show welcome message if no messages yet
         if len(st.session_state.messages) == 0:
@@ -529,22 +534,39 @@ else:
                 What would you like to know?
                 """)
 
+        # Starter questions are answered in the background after ingestion
+        starter_prompt = None
+        if len(st.session_state.messages) == 0:
+            for i, question in enumerate(config.STARTER_QUESTIONS):
+                if st.button(f"💡 {question}", key=f"starter_{i}"):
+                    starter_prompt = question
+
         # Display chat history
         for message in st.session_state.messages:
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
 
         # Handle user input and generate response
-        if prompt := st.chat_input(f"Ask anything about {file_name}..."):
+        if prompt := (st.chat_input(f"Ask anything about {file_name}...") or starter_prompt):
             st.session_state.messages.append({"role": "user", "content": prompt})
             with st.chat_message("user"):
                 st.markdown(prompt)
 
             with st.chat_message("assistant"):
                 with st.spinner("🤔 Analyzing document..."):
-                    response, sources = rag_handler.get_rag_response(
-                        prompt, vectordb, llm, full_text, logger=ui_logger
-                    )
+                    memory = st.session_state.memory
+                    # Precomputed answers were generated without history, so
+                    # they only apply at the start of a conversation
+                    response = document_warmup.precomputed_answer(prompt) if memory.is_empty() else None
+                    for message in document_warmup.drain_logs():
+                        ui_logger(message)
+                    if response is not None:
+                        ui_logger("--- Using precomputed answer ---")
+                        memory.add_turn(prompt, response, [], llm, ui_logger)
+                    else:
+                        response, sources = rag_handler.get_rag_response(
+                            prompt, vectordb, llm, full_text, logger=ui_logger, memory=memory,
+                        )
                     st.markdown(response)
             
             st.session_state.messages.append({"role": "assistant", "content": response})
@@ -0,0 +1,76 @@
+import re
+import subprocess
+import sys
+
+# Modules imported when the app or CLI starts, before any document is opened
+STARTUP_MODULES = [
+    "config",
+    "conversation_memory",
+    "document_processor",
+    "main",
+    "prompt_cache",
+    "rag_handler",
+    "store_lifecycle",
+    "vector_store_manager",
+    "warmup",
+]
+
+# Libraries that must only be loaded on first use
+HEAVY_MODULES = [
+    "chromadb",
+    "google.genai",
+    "langchain_community",
+    "langchain_core",
+    "langchain_google_genai",
+    "langchain_text_splitters",
+    "numpy",
+    "pdfplumber",
+    "pymupdf",
+]
+
+IMPORT_BUDGET_MS = 300 # Cumulative import time allowed for STARTUP_MODULES
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def measure_import_time(modules):
+    """
+    Imports the modules in a fresh interpreter under `python -X importtime`.
+    Returns (total cumulative microseconds of top-level imports, loaded heavy modules).
+    """
+    code = (
+        f"import sys\n"
+        f"for name in {modules!r}: __import__(name)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Only our own top-level entries: nested imports are already included in
+        # their parent's cumulative time, and interpreter startup is excluded
+        if match and len(match.group(3)) == 1 and match.group(4) in modules:
+            total_us += int(match.group(2))
+    loaded_heavy = [m for m in result.stdout.strip().split(",") if m]
+    return total_us, loaded_heavy
+
+def main():
+    """Fails (exit code 1) if startup imports exceed the budget or load heavy libraries."""
+    total_us, loaded_heavy = measure_import_time(STARTUP_MODULES)
+    total_ms = total_us / 1000
+    print(f"Startup import time: {total_ms:.0f} ms (budget {IMPORT_BUDGET_MS} ms)")
+
+    failed = False
+    if loaded_heavy:
+        print(f"Heavy modules loaded at startup: {', '.join(loaded_heavy)}")
+        failed = True
+    if total_ms > IMPORT_BUDGET_MS:
+        print("Startup import budget exceeded.")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import os
+import json
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+from langchain_core.documents import Document
+
+import config
+
+INDEX_DIRNAME = "compact"
+INDEX_META_FILENAME = "index.json"
+INDEX_FORMAT_VERSION = 1
+
+# Rows dequantized at a time while scanning, bounding per-query memory
+SCAN_BLOCK_ROWS = 1024
+
+# Number of set bits in every possible byte, for Hamming distance on packed bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _truncate_and_normalize(vectors, dimensions):
+    """
+    Matryoshka-style truncation: keeps the leading `dimensions` components and
+    re-normalizes to unit length so cosine similarity stays meaningful.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions and dimensions < vectors.shape[-1]:
+        vectors = vectors[..., :dimensions]
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _quantize_int8(vectors):
+    """Symmetric per-vector int8 quantization. Returns (int8 codes, float32 scales)."""
+    scales = np.abs(vectors).max(axis=1, initial=0.0) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def build_compact_index(index_dir, embeddings, texts, metadatas,
+                        dimensions=None, quantization=None, logger=print):
+    """
+    Writes a compact index for the given float embeddings to index_dir.
+    Vectors are truncated to `dimensions`, int8-quantized and, for
+    'binary' quantization, additionally sign-packed for candidate scanning.
+    """
+    dimensions = dimensions or config.COMPACT_INDEX_DIMENSIONS
+    quantization = quantization or config.COMPACT_INDEX_QUANTIZATION
+    if quantization not in ("int8", "binary"):
+        raise ValueError(f"Unknown compact index quantization: {quantization}")
+
+    vectors = _truncate_and_normalize(embeddings, dimensions)
+    if vectors.size == 0:
+        # An empty store still gets a (loadable) empty index
+        vectors = vectors.reshape(0, dimensions or 0)
+    count, dims = vectors.shape
+    logger(f"--- Building {quantization} compact index ({count} vectors, {dims} dims) ---")
+
+    os.makedirs(index_dir, exist_ok=True)
+    codes, scales = _quantize_int8(vectors)
+    codes.tofile(os.path.join(index_dir, "vectors.i8"))
+    scales.tofile(os.path.join(index_dir, "scales.f32"))
+    if quantization == "binary":
+        np.packbits(vectors > 0, axis=1).tofile(os.path.join(index_dir, "bits.u8"))
+
+    with open(os.path.join(index_dir, "documents.jsonl"), "w", encoding="utf-8") as f:
+        for text, metadata in zip(texts, metadatas):
+            f.write(json.dumps({"page_content": text, "metadata": metadata or {}}) + "\n")
+
+    # The metadata file is written last so a partially built index is never loaded
+    with open(os.path.join(index_dir, INDEX_META_FILENAME), "w") as f:
+        json.dump({
+            "format_version": INDEX_FORMAT_VERSION,
+            "count": count,
+            "dimensions": dims,
+            "quantization": quantization,
+            "requested_dimensions": dimensions,
+        }, f)
+    logger("Successfully created the compact index.\n")
+
+def build_compact_index_from_chroma(vectordb, index_dir, logger=print):
+    """Exports the embeddings stored in a Chroma store into a compact index."""
+    data = vectordb.get(include=["embeddings", "documents", "metadatas"])
+    embeddings = data["embeddings"] if data["embeddings"] is not None else []
+    build_compact_index(
+        index_dir, embeddings, data["documents"], data["metadatas"], logger=logger
+    )
+
+def compact_index_exists(index_dir):
+    return os.path.exists(os.path.join(index_dir, INDEX_META_FILENAME))
+
+def compact_index_is_current(index_dir):
+    """
+    True if a complete index exists and was built with the current
+    COMPACT_INDEX_QUANTIZATION and COMPACT_INDEX_DIMENSIONS.
+    """
+    try:
+        with open(os.path.join(index_dir, INDEX_META_FILENAME)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (
+        meta.get("format_version") == INDEX_FORMAT_VERSION
+        and meta.get("quantization") == config.COMPACT_INDEX_QUANTIZATION
+        and "requested_dimensions" in meta
+        and meta["requested_dimensions"] == config.COMPACT_INDEX_DIMENSIONS
+    )
+
+def rebuild_compact_index_from_chroma(vectordb, index_dir, logger=print):
+    """
+    Builds the index next to index_dir and swaps it in, so an index that is
+    still memory-mapped by an open store is never rewritten in place.
+    """
+    staging_dir = tempfile.mkdtemp(prefix=INDEX_DIRNAME + "-", dir=os.path.dirname(index_dir))
+    try:
+        build_compact_index_from_chroma(vectordb, staging_dir, logger=logger)
+        if os.path.exists(index_dir):
+            shutil.rmtree(index_dir)
+        os.rename(staging_dir, index_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+class CompactVectorStore:
+    """
+    Read-only vector store backed by memory-mapped quantized vectors.
+    Exposes the same `similarity_search` call that rag_handler uses on Chroma.
+    """
+
+    def __init__(self, index_dir, embedding_function, rescore_factor=None):
+        with open(os.path.join(index_dir, INDEX_META_FILENAME)) as f:
+            meta = json.load(f)
+        if meta.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact index version in {index_dir}")
+
+        self.index_dir = index_dir
+        self.embedding_function = embedding_function
+        self.count = meta["count"]
+        self.dimensions = meta["dimensions"]
+        self.quantization = meta["quantization"]
+        self.rescore_factor = rescore_factor or config.COMPACT_INDEX_RESCORE_FACTOR
+
+        self._bits = None
+        if self.count == 0:
+            # mmap cannot map an empty file; there is nothing to search anyway
+            self._codes = np.empty((0, self.dimensions), dtype=np.int8)
+            self._scales = np.empty(0, dtype=np.float32)
+            if self.quantization == "binary":
+                self._bits = np.empty((0, (self.dimensions + 7) // 8), dtype=np.uint8)
+            self._documents = []
+            return
+
+        shape = (self.count, self.dimensions)
+        self._codes = np.memmap(os.path.join(index_dir, "vectors.i8"), dtype=np.int8, mode="r", shape=shape)
+        self._scales = np.fromfile(os.path.join(index_dir, "scales.f32"), dtype=np.float32)
+        if self.quantization == "binary":
+            self._bits = np.memmap(
+                os.path.join(index_dir, "bits.u8"), dtype=np.uint8, mode="r",
+                shape=(self.count, (self.dimensions + 7) // 8),
+            )
+        self._documents = None
+
+    def _load_documents(self):
+        if self._documents is None:
+            with open(os.path.join(self.index_dir, "documents.jsonl"), encoding="utf-8") as f:
+                self._documents = [json.loads(line) for line in f]
+        return self._documents
+
+    def _rescore(self, query, rows):
+        """Float query against dequantized int8 vectors for the given (few) rows."""
+        return (self._codes[rows].astype(np.float32) @ query) * self._scales[rows]
+
+    def _scan_top_k(self, query, k):
+        """
+        Exact int8 scan over all rows in blocks of SCAN_BLOCK_ROWS, keeping a
+        running top-k, so only one block is ever dequantized at a time.
+        """
+        best_rows = np.array([], dtype=np.int64)
+        best_scores = np.array([], dtype=np.float32)
+        for start in range(0, self.count, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, self.count)
+            block_scores = (self._codes[start:end].astype(np.float32) @ query) * self._scales[start:end]
+            rows = np.concatenate([best_rows, np.arange(start, end)])
+            scores = np.concatenate([best_scores, block_scores])
+            if len(scores) > k:
+                keep = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[keep], scores[keep]
+            best_rows, best_scores = rows, scores
+        return best_rows, best_scores
+
+    def _hamming_distances(self, query_bits):
+        distances = np.empty(self.count, dtype=np.int32)
+        for start in range(0, self.count, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, self.count)
+            distances[start:end] = _POPCOUNT[np.bitwise_xor(self._bits[start:end], query_bits)].sum(axis=1, dtype=np.int32)
+        return distances
+
+    def _search_indices(self, embedding, k):
+        query = _truncate_and_normalize(embedding, self.dimensions)
+        k = min(k, self.count)
+        if k <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        if self._bits is not None:
+            # Hamming distance on sign bits picks candidates; int8 re-scores them.
+            distances = self._hamming_distances(np.packbits(query > 0))
+            n_candidates = min(self.count, k * self.rescore_factor)
+            candidates = np.argpartition(distances, n_candidates - 1)[:n_candidates]
+            scores = self._rescore(query, candidates)
+        else:
+            candidates, scores = self._scan_top_k(query, k)
+
+        top = np.argsort(-scores)[:k]
+        return candidates[top], scores[top]
+
+    def similarity_search_by_vector_with_scores(self, embedding, k=4):
+        indices, scores = self._search_indices(embedding, k)
+        documents = self._load_documents()
+        return [
+            (Document(page_content=documents[i]["page_content"], metadata=documents[i]["metadata"]), float(s))
+            for i, s in zip(indices, scores)
+        ]
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_scores(embedding, k)]
+
+    def similarity_search(self, query, k=4):
+        if self.count == 0:
+            return []
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector(embedding, k)
+
+    def memory_bytes_per_document(self):
+        """Bytes scanned per document at query time (sign bits or int8 codes)."""
+        if self._bits is not None:
+            return self._bits.shape[1]
+        return self.dimensions + self._scales.itemsize
+
+    def stored_bytes_per_document(self):
+        """Bytes stored per document: int8 codes and scale, plus sign bits in binary mode."""
+        stored = self.dimensions + self._scales.itemsize
+        if self._bits is not None:
+            stored += self._bits.shape[1]
+        return stored
+
+def benchmark_recall(vectordb, index_dir, k=None, logger=print):
+    """
+    Offline recall check: every stored float embedding is used as a query
+    against both the exact float vectors and the compact index, and the
+    overlap of their top-k results is reported. No embedding API calls.
+    """
+    k = k or config.SIMILARITY_SEARCH_K
+    data = vectordb.get(include=["embeddings"])
+    full = _truncate_and_normalize(data["embeddings"], None)
+    compact = CompactVectorStore(index_dir, embedding_function=None)
+
+    hits = 0
+    for query in full:
+        exact = set(np.argsort(-(full @ query))[:k])
+        approx, _ = compact._search_indices(query, k)
+        hits += len(exact & set(approx.tolist()))
+    recall = hits / (len(full) * min(k, len(full))) if len(full) else 0.0
+
+    float_bytes = full.shape[1] * 4
+    stored_bytes = compact.stored_bytes_per_document()
+    scanned_bytes = compact.memory_bytes_per_document()
+    logger(f"Compact index: {compact.quantization}, {compact.dimensions} dims")
+    logger(f"Bytes stored per document: float32={float_bytes}, compact={stored_bytes} "
+           f"({float_bytes / stored_bytes:.1f}x smaller)")
+    logger(f"Bytes scanned per document and query: {scanned_bytes} ({float_bytes / scanned_bytes:.1f}x fewer)")
+    logger(f"Recall@{k} vs exact float search: {recall:.3f}")
+    return recall, float_bytes / stored_bytes
+
+if __name__ == "__main__":
+    import vector_store_manager
+
+    if len(sys.argv) != 2:
+        print("Usage: python compact_index.py <pdf_path>")
+        sys.exit(1)
+    pdf_path = sys.argv[1]
+    persist_directory = vector_store_manager.get_persist_directory(pdf_path)
+    vectordb = vector_store_manager.load_or_create_chroma_store(pdf_path)
+    index_dir = os.path.join(persist_directory, INDEX_DIRNAME)
+    if not compact_index_is_current(index_dir):
+        rebuild_compact_index_from_chroma(vectordb, index_dir)
+    benchmark_recall(vectordb, index_dir)
@@ -4,18 +4,79 @@
 UPLOAD_DIRECTORY = "uploads"
 VECTOR_STORE_BASE_DIR = "vector_stores"
 METADATA_FILENAME = "metadata.json"
+FULL_TEXT_FILENAME = "full_text.txt" # Cached extracted text, stored next to the vector store
+STARTER_ANSWERS_FILENAME = "starter_answers.json" # Cached answers to STARTER_QUESTIONS
+
+# Vector Store Lifecycle (see store_lifecycle.py)
+STORE_QUOTA_BYTES = 2 * 1024**3 # Least-recently-used stores are removed above this total size; None disables
+STORE_TTL_DAYS = 30 # Stores not accessed for this long are removed; None disables
+STORE_PARTIAL_GRACE_SECONDS = 3600 # Incomplete stores younger than this may still be building
+UPLOAD_TTL_DAYS = 7 # Uploads not backing any store are removed after this long; None disables
+STORE_GC_ON_CREATE = True # Run garbage collection after each new store is built
 
 # Google Generative AI Models
+MODEL_BACKEND = "google" # "google" or "stub" (offline stand-ins from stub_models.py, no API key needed)
 LLM_MODEL_NAME = "gemini-2.5-flash"
 EMBEDDING_MODEL_NAME = "models/gemini-embedding-001"
 
 # Text Splitting Parameters
 CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 100
+CHUNK_OVERLAP = 100 # Only applied when a single paragraph exceeds CHUNK_SIZE in "layout" mode
+CHUNKING_STRATEGY = "layout" # "layout" (headings/tables/code aware) or "recursive" (plain character splitter)
+LAYOUT_HEADING_SIZE_RATIO = 1.15 # Blocks this much larger than body text are treated as headings
+LAYOUT_HEADING_MAX_CHARS = 120 # Longer blocks are never treated as headings
+LAYOUT_MIN_CHUNK_SIZE = 400 # A heading only starts a new chunk once the current one is this long
+LAYOUT_MAX_ATOMIC_CHUNK_SIZE = 4000 # Tables/code blocks larger than this are split on line boundaries
+INGEST_WORKERS = None # Processes used to parse files of a directory/archive in parallel; None uses all CPU cores
+
+# Page Filtering and OCR (applied before chunking, see page_analysis.py)
+PAGE_FILTER_ENABLED = True # Skip empty/duplicate pages and strip repeated headers/footers
+PAGE_MIN_TEXT_CHARS = 20 # Pages with less text than this are skipped (or OCR'd if image-only)
+PAGE_SCAN_IMAGE_COVERAGE = 0.5 # Low-text pages with at least this image coverage are treated as scanned
+PAGE_MARGIN_FRACTION = 0.08 # Top/bottom band of the page searched for headers and footers
+PAGE_BOILERPLATE_MIN_PAGES = 3 # A margin line must repeat on at least this many pages...
+PAGE_BOILERPLATE_MIN_FRACTION = 0.3 # ...and on this fraction of all pages to count as a header/footer
+OCR_ENABLED = False # Requires Tesseract; scanned pages are skipped when disabled
+OCR_WORKERS = None # OCR worker processes; None uses all CPU cores
+OCR_LANGUAGE = "eng"
+OCR_DPI = 300
 
 # Vector Store and Retrieval Parameters
 SIMILARITY_SEARCH_K = 3 # Number of relevant chunks to retrieve
+RERANK_CANDIDATES = None # Fetch this many candidates and re-rank them lexically; None disables
+RERANK_RRF_K = 60 # Reciprocal rank fusion constant for re-ranking
+VECTOR_INDEX_FORMAT = "chroma" # "chroma" or "compact" (quantized, memory-mapped index)
+COMPACT_INDEX_QUANTIZATION = "int8" # "int8" (4x smaller) or "binary" (scans 32x fewer bytes; stores sign bits plus int8 codes for re-scoring, ~3.5x smaller)
+COMPACT_INDEX_DIMENSIONS = None # Matryoshka truncation, e.g. 768; None keeps all 3072 dimensions
+COMPACT_INDEX_RESCORE_FACTOR = 10 # Binary mode re-scores k * this many candidates
+
+# Context Caching (provider-side cached content for long, repeated prompt prefixes)
+CONTEXT_CACHE_ENABLED = True
+CONTEXT_CACHE_MIN_TOKENS = 1024 # Prefixes shorter than this are sent normally (provider minimum)
+CONTEXT_CACHE_TTL_SECONDS = 3600 # Lifetime of a cached document context
+CONTEXT_CACHE_RETRY_SECONDS = 600 # After a failed cache creation, wait this long before trying again
+
+# Conversation Memory
+MEMORY_TOKEN_BUDGET = 1000 # Approximate tokens of history (summary + recent turns) sent with each question
+MEMORY_RECENT_TURNS = 2 # Turns always kept verbatim (at least 1); older ones are summarized
+MEMORY_SUMMARY_WORDS = 150 # Maximum length of the rolling summary
+MEMORY_ANSWER_CHARS = 600 # Answers are truncated to this length in the history
+
+# Warm-up (see warmup.py)
+STARTER_QUESTIONS = [ # Answered ahead of time after ingestion and offered as one-click prompts; [] disables
+    "Give a short summary of this document.",
+    "What are the key terms and concepts introduced in this document?",
+]
 
 # Rate Limiting for Embeddings
 EMBEDDING_BATCH_SIZE = 50 # Number of chunks to process at a time
-RATE_LIMIT_DELAY = 60 # Seconds to wait between batches
\ No newline at end of file
+RATE_LIMIT_DELAY = 60 # Seconds to wait between batches
+
+# HTTP API (see api_server.py)
+API_HOST = "127.0.0.1"
+API_PORT = 8000
+API_MAX_CONCURRENT_PER_CLIENT = 8 # In-flight ingest/query requests per client before 429
+API_WORKER_THREADS = 32 # Threads running blocking retrieval and model calls
+API_KEEPALIVE_TIMEOUT = 30 # Seconds an idle keep-alive connection is held open
+API_MAX_BODY_BYTES = 50 * 1024 * 1024 # Largest accepted request body (PDF uploads)
+API_INGEST_ROOT = None # Directory that POST /ingest {"path": ...} may read from (relative paths resolve here); None disables path ingest
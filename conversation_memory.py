@@ -0,0 +1,70 @@
+import config
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token)."""
+    return len(text) // 4
+
+class ConversationMemory:
+    """
+    Bounded chat history for follow-up questions.
+    The most recent turns are kept verbatim; older turns are folded into a
+    rolling summary whenever the history exceeds MEMORY_TOKEN_BUDGET, so the
+    prompt overhead stays constant however long the conversation gets.
+    The chunks retrieved for the previous question are kept for reuse.
+    """
+
+    def __init__(self):
+        self.summary = ""
+        self.turns = []  # list of (standalone question, answer)
+        self.last_query = None
+        self.last_docs = []
+
+    def is_empty(self):
+        return not self.summary and not self.turns
+
+    def clear(self):
+        self.__init__()
+
+    def _format_turn(self, question, answer):
+        if len(answer) > config.MEMORY_ANSWER_CHARS:
+            answer = answer[:config.MEMORY_ANSWER_CHARS].rstrip() + " ..."
+        return f"User: {question}\nAssistant: {answer}"
+
+    def format_history(self):
+        """Returns the summary and recent turns as prompt text."""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation: {self.summary}")
+        parts.extend(self._format_turn(q, a) for q, a in self.turns)
+        return "\n\n".join(parts)
+
+    def add_turn(self, question, answer, retrieved_docs, llm, logger=print):
+        """Records a completed turn and compresses older turns if over budget."""
+        self.turns.append((question, answer))
+        self.last_query = question
+        self.last_docs = list(retrieved_docs)
+        if estimate_tokens(self.format_history()) > config.MEMORY_TOKEN_BUDGET:
+            self._compress(llm, logger)
+
+    def _compress(self, llm, logger=print):
+        """Folds all but the most recent turns into the rolling summary with one LLM call."""
+        keep = max(1, config.MEMORY_RECENT_TURNS)
+        old_turns = self.turns[:-keep]
+        if not old_turns:
+            return
+        self.turns = self.turns[-keep:]
+
+        logger(f"--- Compressing {len(old_turns)} earlier turn(s) into the conversation summary ---")
+        turns_text = "\n\n".join(self._format_turn(q, a) for q, a in old_turns)
+        prompt = f"""Update the running summary of a conversation about a document.
+Keep the topics discussed, facts established and any open questions. Use at most {config.MEMORY_SUMMARY_WORDS} words.
+
+Current summary:
+{self.summary or "(none)"}
+
+New turns:
+{turns_text}
+
+Updated summary:"""
+        response = llm.invoke(prompt)
+        self.summary = response.content.strip()
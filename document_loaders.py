@@ -0,0 +1,453 @@
+import os
+import contextlib
+import gzip
+import mimetypes
+import re
+import tarfile
+import tempfile
+import zipfile
+from html.parser import HTMLParser
+
+# Registry of supported formats: name -> {"extensions", "mime_types", "parser"}.
+# A parser is a generator yielding raw units, dicts with 'type'
+# (heading/paragraph/code/table), 'text' and, for headings, 'level'.
+# PDFs have no parser here: document_processor handles them with its
+# layout-aware PDF pipeline.
+FORMATS = {}
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+HTML_READ_SIZE = 64 * 1024
+
+def register_loader(name, extensions, mime_types=()):
+    """Decorator registering a unit parser for the given extensions and MIME types."""
+    def decorator(parser):
+        FORMATS[name] = {"extensions": tuple(extensions), "mime_types": tuple(mime_types), "parser": parser}
+        return parser
+    return decorator
+
+FORMATS["pdf"] = {"extensions": (".pdf",), "mime_types": ("application/pdf",), "parser": None}
+
+def supported_extensions():
+    return sorted(ext for spec in FORMATS.values() for ext in spec["extensions"])
+
+def detect_format(path, mime_type=None):
+    """Returns the registered format name for a file, or None if unsupported."""
+    if mime_type:
+        for name, spec in FORMATS.items():
+            if mime_type.split(";")[0].strip() in spec["mime_types"]:
+                return name
+
+    lower = path.lower()
+    if lower.endswith(".gz") and not lower.endswith(".tar.gz"):
+        lower = lower[:-3]  # Compressed man pages, e.g. ls.1.gz
+    for name, spec in FORMATS.items():
+        if lower.endswith(spec["extensions"]):
+            return name
+
+    guessed, _ = mimetypes.guess_type(path)
+    for name, spec in FORMATS.items():
+        if guessed in spec["mime_types"]:
+            return name
+    return None
+
+def is_archive_name(name):
+    return name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def is_archive(path):
+    return os.path.isfile(path) and is_archive_name(path)
+
+def is_collection(path):
+    """True for inputs holding several documents (a directory or an archive)."""
+    return os.path.isdir(path) or is_archive(path)
+
+def _walk_supported(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            if detect_format(path):
+                yield path
+
+@contextlib.contextmanager
+def open_collection(path):
+    """
+    Yields [(file_path, display_name), ...] for every supported document in
+    a directory or archive. Archives are extracted to a temporary directory
+    that is removed on exit.
+    """
+    if os.path.isdir(path):
+        yield [(p, os.path.relpath(p, path)) for p in _walk_supported(path)]
+        return
+
+    with tempfile.TemporaryDirectory(prefix="rag_archive_") as tmp_dir:
+        if path.lower().endswith(".zip"):
+            with zipfile.ZipFile(path) as archive:
+                archive.extractall(tmp_dir)
+        else:
+            with tarfile.open(path) as archive:
+                archive.extractall(tmp_dir, filter="data")
+        archive_name = os.path.basename(path)
+        yield [(p, os.path.join(archive_name, os.path.relpath(p, tmp_dir))) for p in _walk_supported(tmp_dir)]
+
+def _open_text(path):
+    opener = gzip.open if path.lower().endswith(".gz") else open
+    return opener(path, "rt", encoding="utf-8", errors="replace")
+
+def iter_units(path, format_name=None):
+    """Streams raw units from a non-PDF document using its registered parser."""
+    format_name = format_name or detect_format(path)
+    spec = FORMATS.get(format_name)
+    if spec is None or spec["parser"] is None:
+        raise ValueError(f"No text parser registered for {path}")
+    yield from spec["parser"](path)
+
+def _paragraph(lines):
+    text = "\n".join(lines).strip()
+    return {"type": "paragraph", "text": text} if text else None
+
+@register_loader("text", [".txt", ".text"], ["text/plain"])
+def parse_text(path):
+    buffer = []
+    with _open_text(path) as f:
+        for line in f:
+            if line.strip():
+                buffer.append(line.rstrip())
+            elif buffer:
+                yield _paragraph(buffer)
+                buffer = []
+    if buffer:
+        yield _paragraph(buffer)
+
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+MARKDOWN_FENCE = re.compile(r"^\s*(```|~~~)")
+
+@register_loader("markdown", [".md", ".markdown", ".mdown"], ["text/markdown", "text/x-markdown"])
+def parse_markdown(path):
+    """ATX/setext headings, fenced code blocks, pipe tables and paragraphs."""
+    buffer, table, code, fence = [], [], [], None
+
+    def flush():
+        units = []
+        if buffer:
+            units.append(_paragraph(buffer))
+            buffer.clear()
+        if table:
+            units.append({"type": "table", "text": "\n".join(table)})
+            table.clear()
+        return [u for u in units if u]
+
+    with _open_text(path) as f:
+        for raw in f:
+            line = raw.rstrip("\n")
+            if fence:
+                if line.strip().startswith(fence):
+                    yield {"type": "code", "text": "\n".join(code)}
+                    code, fence = [], None
+                else:
+                    code.append(line)
+                continue
+
+            fence_match = MARKDOWN_FENCE.match(line)
+            if fence_match:
+                yield from flush()
+                fence = fence_match.group(1)
+                continue
+
+            heading = MARKDOWN_HEADING.match(line)
+            if heading:
+                yield from flush()
+                yield {"type": "heading", "text": heading.group(2), "level": len(heading.group(1))}
+                continue
+
+            # Setext headings: a single paragraph line underlined with === or ---
+            if len(buffer) == 1 and re.fullmatch(r"\s*(=+|-+)\s*", line):
+                title = buffer.pop()
+                yield {"type": "heading", "text": title.strip(), "level": 1 if "=" in line else 2}
+                continue
+
+            # Horizontal rules separate paragraphs
+            if not buffer and re.fullmatch(r"\s*([-*_])(\s*\1){2,}\s*", line):
+                yield from flush()
+                continue
+
+            if line.lstrip().startswith("|"):
+                if buffer:
+                    yield from flush()
+                if not re.fullmatch(r"\s*\|?[\s:|-]+\|?\s*", line):  # Skip the |---|---| separator
+                    table.append(" | ".join(cell.strip() for cell in line.strip().strip("|").split("|")))
+                continue
+
+            if not line.strip():
+                yield from flush()
+            else:
+                if table:
+                    yield from flush()
+                buffer.append(line)
+
+    if fence and code:
+        yield {"type": "code", "text": "\n".join(code)}
+    yield from flush()
+
+RST_ADORNMENT = re.compile(r"^([=\-~^\"'`#*+:.])\1{2,}\s*$")
+RST_CODE_DIRECTIVE = re.compile(r"^\.\.\s+(code-block|code|sourcecode)::")
+
+@register_loader("restructuredtext", [".rst", ".rest"], ["text/x-rst", "text/prs.fallenstein.rst"])
+def parse_restructuredtext(path):
+    """
+    Section titles (underlined, optionally overlined; levels follow the order
+    adornment styles first appear), literal blocks after '::' or code
+    directives, grid tables and paragraphs.
+    """
+    levels = []  # adornment characters in order of first use
+    buffer, literal, in_literal, literal_pending = [], [], False, False
+    table = []
+
+    def flush_paragraph():
+        unit = _paragraph(buffer)
+        buffer.clear()
+        return [unit] if unit else []
+
+    with _open_text(path) as f:
+        lines = (line.rstrip("\n") for line in f)
+        for line in lines:
+            if in_literal:
+                if not line.strip() or line[:1].isspace():
+                    literal.append(line)
+                    continue
+                yield {"type": "code", "text": "\n".join(literal).strip("\n")}
+                literal, in_literal = [], False
+
+            if literal_pending:
+                if not line.strip():
+                    in_literal, literal_pending = True, False
+                    continue
+                if line[:1].isspace():
+                    continue  # Directive options such as :linenos:
+
+            stripped = line.strip()
+            if stripped.startswith("+-") or (table and stripped.startswith("|")):
+                yield from flush_paragraph()
+                if not stripped.startswith("+"):
+                    table.append(" | ".join(c.strip() for c in stripped.strip("|").split("|")))
+                continue
+            if table:
+                yield {"type": "table", "text": "\n".join(table)}
+                table = []
+
+            adornment = RST_ADORNMENT.match(line)
+            if adornment and len(buffer) == 1 and len(stripped) >= len(buffer[0].strip()):
+                char = adornment.group(1)
+                if char not in levels:
+                    levels.append(char)
+                yield {"type": "heading", "text": buffer.pop().strip(), "level": levels.index(char) + 1}
+                continue
+            if adornment and not buffer:
+                continue  # Overline of an overlined title
+
+            if RST_CODE_DIRECTIVE.match(stripped):
+                yield from flush_paragraph()
+                literal_pending = True
+                continue
+
+            if not stripped:
+                yield from flush_paragraph()
+                continue
+
+            buffer.append(line)
+            if stripped.endswith("::"):
+                buffer[-1] = line.rstrip()[:-1]  # "Example::" renders as "Example:"
+                yield from flush_paragraph()
+                literal_pending = True
+
+    if literal:
+        yield {"type": "code", "text": "\n".join(literal).strip("\n")}
+    if table:
+        yield {"type": "table", "text": "\n".join(table)}
+    yield from flush_paragraph()
+
+class _HtmlUnitParser(HTMLParser):
+    """Collects units from HTML as it is fed, leaving them in `units`."""
+
+    HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+    BLOCKS = {"p", "div", "li", "dd", "dt", "blockquote", "section", "article", "br"}
+    SKIPPED = {"script", "style", "nav", "header", "footer", "noscript", "svg"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.units = []
+        self.text = []
+        self.heading_level = None
+        self.pre_depth = 0
+        self.skip_depth = 0
+        self.table_rows = None
+        self.row = None
+
+    def _flush_text(self):
+        text = " ".join("".join(self.text).split())
+        self.text = []
+        if not text:
+            return
+        if self.heading_level:
+            self.units.append({"type": "heading", "text": text, "level": self.heading_level})
+        else:
+            self.units.append({"type": "paragraph", "text": text})
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self.skip_depth += 1
+        elif self.skip_depth:
+            return
+        elif tag in self.HEADINGS:
+            self._flush_text()
+            self.heading_level = self.HEADINGS[tag]
+        elif tag == "pre":
+            self._flush_text()
+            self.pre_depth += 1
+        elif tag == "table":
+            self._flush_text()
+            self.table_rows = []
+        elif tag == "tr" and self.table_rows is not None:
+            self.row = []
+        elif tag in ("td", "th") and self.row is not None:
+            self.text = []
+        elif tag in self.BLOCKS and not self.pre_depth and self.table_rows is None:
+            self._flush_text()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif self.skip_depth:
+            return
+        elif tag in self.HEADINGS:
+            self._flush_text()
+            self.heading_level = None
+        elif tag == "pre" and self.pre_depth:
+            self.pre_depth -= 1
+            code = "".join(self.text).strip("\n")
+            self.text = []
+            if code.strip():
+                self.units.append({"type": "code", "text": code})
+        elif tag in ("td", "th") and self.row is not None:
+            self.row.append(" ".join("".join(self.text).split()))
+            self.text = []
+        elif tag == "tr" and self.row is not None:
+            if any(self.row):
+                self.table_rows.append(" | ".join(self.row))
+            self.row = None
+        elif tag == "table" and self.table_rows is not None:
+            if self.table_rows:
+                self.units.append({"type": "table", "text": "\n".join(self.table_rows)})
+            self.table_rows = None
+        elif tag in self.BLOCKS and not self.pre_depth and self.table_rows is None:
+            self._flush_text()
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush_text()
+
+@register_loader("html", [".html", ".htm", ".xhtml"], ["text/html", "application/xhtml+xml"])
+def parse_html(path):
+    parser = _HtmlUnitParser()
+    with _open_text(path) as f:
+        while True:
+            data = f.read(HTML_READ_SIZE)
+            if not data:
+                break
+            parser.feed(data)
+            yield from parser.units
+            parser.units = []
+    parser.close()
+    yield from parser.units
+
+TROFF_ESCAPES = [
+    (re.compile(r"\\f(\[[^\]]*\]|\(..|.)"), ""),  # Font changes
+    (re.compile(r"\\s[+-]?\d"), ""),              # Size changes
+    (re.compile(r"\\\(em|\\\(en"), "-"),
+    (re.compile(r"\\\(..|\\\[[^\]]*\]"), ""),     # Other special characters
+    (re.compile(r"\\[-]"), "-"),
+    (re.compile(r"\\[&|^ ]"), " "),
+    (re.compile(r"\\e"), "\\\\"),
+]
+TROFF_FONT_MACROS = {"B", "I", "SM", "SB", "BI", "BR", "IB", "IR", "RB", "RI"}
+TROFF_PARAGRAPH_MACROS = {"PP", "P", "LP", "TP", "IP", "HP", "sp", "br", "RS", "RE"}
+
+def _troff_text(text):
+    for pattern, replacement in TROFF_ESCAPES:
+        text = pattern.sub(replacement, text)
+    return text
+
+def _troff_args(args):
+    """Splits macro arguments, honouring double quotes."""
+    return [a.strip('"') for a in re.findall(r'"[^"]*"|\S+', args)]
+
+@register_loader("manpage", [".1", ".2", ".3", ".4", ".5", ".6", ".7", ".8", ".9", ".man"], ["text/troff", "application/x-troff-man"])
+def parse_manpage(path):
+    """troff man macros: .TH title, .SH/.SS headings, .nf/.EX code and paragraphs."""
+    buffer, code, in_code = [], [], False
+
+    def flush():
+        unit = _paragraph(buffer)
+        buffer.clear()
+        return [unit] if unit else []
+
+    with _open_text(path) as f:
+        for raw in f:
+            line = raw.rstrip("\n")
+            if line.startswith(('.\\"', "'\\\"")):
+                continue
+            if not line.startswith((".", "'")):
+                if in_code:
+                    code.append(_troff_text(line))
+                elif line.strip():
+                    buffer.append(_troff_text(line))
+                else:
+                    yield from flush()
+                continue
+
+            macro, _, args = line[1:].strip().partition(" ")
+            if macro == "TH":
+                title = " ".join(_troff_args(args)[:2])
+                yield {"type": "heading", "text": title, "level": 1}
+            elif macro in ("SH", "SS"):
+                yield from flush()
+                level = 2 if macro == "SH" else 3
+                yield {"type": "heading", "text": _troff_text(" ".join(_troff_args(args))), "level": level}
+            elif macro in ("nf", "EX"):
+                yield from flush()
+                in_code = True
+            elif macro in ("fi", "EE"):
+                if code:
+                    yield {"type": "code", "text": "\n".join(code).strip("\n")}
+                code, in_code = [], False
+            elif macro in TROFF_PARAGRAPH_MACROS:
+                yield from flush()
+                if macro == "IP" and args:
+                    buffer.append(_troff_text(_troff_args(args)[0]))
+            elif macro in TROFF_FONT_MACROS:
+                words = _troff_args(args)
+                separator = "" if len(macro) == 2 and macro not in ("SM", "SB") else " "
+                buffer.append(_troff_text(separator.join(words)))
+
+    if code:
+        yield {"type": "code", "text": "\n".join(code).strip("\n")}
+    yield from flush()
+
+def with_heading_paths(raw_units, page=0):
+    """Adds 'page' and 'heading_path' to raw units, tracking the heading stack."""
+    heading_stack = []  # list of (level, title)
+    for unit in raw_units:
+        if unit is None:
+            continue
+        if unit["type"] == "heading":
+            heading_stack = [(lvl, t) for lvl, t in heading_stack if lvl < unit["level"]]
+            heading_stack.append((unit["level"], unit["text"]))
+        yield {
+            "type": unit["type"],
+            "text": unit["text"],
+            "page": page,
+            "heading_path": " > ".join(t for _, t in heading_stack),
+        }
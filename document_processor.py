@@ -1,27 +1,454 @@
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import os
+import re
+from collections import Counter
+from concurrent.futures import as_completed
+
 import config
+import document_loaders
+import page_analysis
+
+HEADING_NUMBER_PATTERN = re.compile(r"^(\d+(?:\.\d+)*)\.?\s+\S")
+MONOSPACE_FONT_PATTERN = re.compile(r"mono|courier|consol|tt\d|code", re.IGNORECASE)
+BOLD_FONT_PATTERN = re.compile(r"bold|medi|semibold|heavy|black", re.IGNORECASE)
+
+# PDF and LangChain libraries are imported on first use so that importing
+# this module (e.g. to render the upload page) stays fast.
+
+def _load_pdf_pages(pdf_path):
+    """Loads a PDF as one Document per page."""
+    from langchain_community.document_loaders import PyMuPDFLoader
+    return PyMuPDFLoader(pdf_path).load()
+
+def _create_text_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=config.CHUNK_SIZE, chunk_overlap=config.CHUNK_OVERLAP
+    )
+
+def _discard(message):
+    pass
+
+def _ingest_workers(file_count):
+    return max(1, min(file_count, config.INGEST_WORKERS or os.cpu_count() or 1))
+
+def full_text_from_chunks(chunks):
+    """
+    Rebuilds a collection's full text from its chunks, one "# <file>"
+    section per file, so the files are not parsed a second time.
+    """
+    sections = {}
+    for chunk in chunks:
+        sections.setdefault(chunk.metadata["source"], []).append(chunk.page_content)
+    return "\n\n".join(f"# {name}\n" + "\n\n".join(texts) for name, texts in sections.items())
 
 def get_full_text(pdf_path, logger=print):
-    """Extracts the full text content from a PDF."""
-    loader = PyMuPDFLoader(pdf_path)
-    docs = loader.load()
+    """Extracts the full text content from a document, directory or archive."""
+    if document_loaders.is_collection(pdf_path):
+        return full_text_from_chunks(split_collection(pdf_path, logger=logger))
+
+    format_name = document_loaders.detect_format(pdf_path)
+    if format_name not in (None, "pdf"):
+        return "\n".join(u["text"] for u in document_loaders.iter_units(pdf_path, format_name) if u)
+
+    docs = _load_pdf_pages(pdf_path)
     return "\n".join(doc.page_content for doc in docs)
 
+def _is_bold(span):
+    return bool(span["flags"] & 16) or bool(BOLD_FONT_PATTERN.search(span["font"]))
+
+def _is_monospace(span):
+    return bool(span["flags"] & 8) or bool(MONOSPACE_FONT_PATTERN.search(span["font"]))
+
+def _block_text(block):
+    lines = ["".join(span["text"] for span in line["spans"]) for line in block["lines"]]
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+def _body_font_size(pages):
+    """Returns the font size that covers the most characters in the document."""
+    sizes = Counter()
+    for page in pages:
+        for block in page["blocks"]:
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    sizes[round(span["size"])] += len(span["text"].strip())
+    return sizes.most_common(1)[0][0] if sizes else 0
+
+def _classify_block(block, text, body_size):
+    """Labels a text block as 'heading', 'code' or 'paragraph'."""
+    spans = [s for line in block["lines"] for s in line["spans"] if s["text"].strip()]
+    if not spans:
+        return "paragraph"
+
+    if len(block["lines"]) >= 2 and all(_is_monospace(s) for s in spans):
+        return "code"
+
+    max_size = max(s["size"] for s in spans)
+    is_short = len(text) <= config.LAYOUT_HEADING_MAX_CHARS and len(block["lines"]) <= 2
+    is_larger = max_size >= body_size * config.LAYOUT_HEADING_SIZE_RATIO
+    is_all_bold = all(_is_bold(s) for s in spans) and max_size >= body_size * 0.95
+    if is_short and (is_larger or is_all_bold) and not text.endswith((".", ",", ":")):
+        return "heading"
+    return "paragraph"
+
+def _table_to_text(rows):
+    """Renders extracted table rows as pipe-separated lines."""
+    lines = []
+    for row in rows:
+        cells = [" ".join((cell or "").split()) for cell in row]
+        if any(cells):
+            lines.append(" | ".join(cells))
+    return "\n".join(lines)
+
+def _find_tables(pdf_path, logger=print):
+    """Returns {page_number: [(bbox, text), ...]} for tables detected by pdfplumber."""
+    import pdfplumber
+
+    tables = {}
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_number, page in enumerate(pdf.pages):
+                for table in page.find_tables():
+                    text = _table_to_text(table.extract())
+                    if text:
+                        tables.setdefault(page_number, []).append((table.bbox, text))
+    except Exception as e:
+        logger(f"Table detection failed, continuing without it: {e}")
+    return tables
+
+def _inside(bbox, region):
+    """True if the centre of bbox lies within region."""
+    cx = (bbox[0] + bbox[2]) / 2
+    cy = (bbox[1] + bbox[3]) / 2
+    return region[0] <= cx <= region[2] and region[1] <= cy <= region[3]
+
+def _heading_level(text, size, heading_sizes):
+    """Numbered headings use their numbering depth, others their font-size rank."""
+    match = HEADING_NUMBER_PATTERN.match(text)
+    if match:
+        return match.group(1).count(".") + 1
+    return heading_sizes.index(round(size)) + 1 if round(size) in heading_sizes else 1
+
+def _is_boilerplate_block(block, text, page_height, page_report):
+    if not page_report or not page_analysis.in_margin(block["bbox"], page_height):
+        return False
+    return all(
+        page_analysis.normalize_line(line) in page_report["boilerplate"]
+        for line in text.splitlines() if line.strip()
+    )
+
+def extract_layout_units(pdf_path, logger=print, page_report=None, ocr_texts=None):
+    """
+    Walks the PDF's text blocks in reading order and returns a list of units,
+    each a dict with 'type' (heading/paragraph/code/table), 'text', 'page'
+    and 'heading_path'. Table regions found by pdfplumber replace the text
+    blocks they cover so a table is always one unit. Pages and header/footer
+    lines flagged in page_report are left out; OCR text replaces the text
+    layer of scanned pages.
+    """
+    import pymupdf
+
+    tables = _find_tables(pdf_path, logger=logger)
+    with pymupdf.open(pdf_path) as pdf:
+        total_pages = pdf.page_count
+        pages = []
+        for page in pdf:
+            page_dict = page.get_text("dict", sort=True)
+            page_dict["blocks"] = [b for b in page_dict["blocks"] if b["type"] == 0]
+            pages.append(page_dict)
+
+    body_size = _body_font_size(pages)
+
+    ocr_texts = ocr_texts or {}
+    excluded_pages = set(page_report["skip"]) | set(page_report["ocr"]) if page_report else set()
+
+    raw_units = []
+    for page_number, page in enumerate(pages):
+        if page_number in ocr_texts:
+            for paragraph in re.split(r"\n\s*\n", ocr_texts[page_number]):
+                if paragraph.strip():
+                    raw_units.append({"type": "paragraph", "text": paragraph.strip(), "page": page_number, "size": body_size})
+            continue
+        if page_number in excluded_pages:
+            continue
+
+        page_tables = list(tables.get(page_number, []))
+        emitted_tables = set()
+        for block in page["blocks"]:
+            table_index = next(
+                (i for i, (bbox, _) in enumerate(page_tables) if _inside(block["bbox"], bbox)), None
+            )
+            if table_index is not None:
+                if table_index not in emitted_tables:
+                    emitted_tables.add(table_index)
+                    raw_units.append(
+                        {"type": "table", "text": page_tables[table_index][1], "page": page_number, "size": body_size}
+                    )
+                continue
+
+            text = _block_text(block)
+            # Skip empty blocks, bare page numbers and repeated headers/footers
+            if not text or text.isdigit() or _is_boilerplate_block(block, text, page["height"], page_report):
+                continue
+            size = max((s["size"] for line in block["lines"] for s in line["spans"]), default=body_size)
+            raw_units.append(
+                {"type": _classify_block(block, text, body_size), "text": text, "page": page_number, "size": size}
+            )
+
+        for i, (_, text) in enumerate(page_tables):
+            if i not in emitted_tables:
+                raw_units.append({"type": "table", "text": text, "page": page_number, "size": body_size})
+
+    heading_sizes = sorted(
+        {round(u["size"]) for u in raw_units if u["type"] == "heading"}, reverse=True
+    )
+    heading_stack = []  # list of (level, title)
+    units = []
+    for unit in raw_units:
+        if unit["type"] == "heading":
+            title = " ".join(unit["text"].split())
+            unit["text"] = title
+            level = _heading_level(title, unit["size"], heading_sizes)
+            heading_stack = [(lvl, t) for lvl, t in heading_stack if lvl < level]
+            heading_stack.append((level, title))
+        units.append({
+            "type": unit["type"],
+            "text": unit["text"],
+            "page": unit["page"],
+            "heading_path": " > ".join(t for _, t in heading_stack),
+        })
+    return units, total_pages
+
+def _split_atomic(text, limit):
+    """
+    Splits an oversize table or code block on line boundaries. Tables repeat
+    their header row in every piece so each chunk stays self-describing.
+    """
+    lines = text.split("\n")
+    header = lines[0] if " | " in lines[0] else None
+    pieces, current = [], []
+    for line in lines:
+        candidate = "\n".join(current + [line])
+        if current and len(candidate) > limit:
+            pieces.append("\n".join(current))
+            current = [header] if header else []
+        current.append(line)
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+def _split_at_sentence(text, limit):
+    """
+    Splits text after the last sentence end that keeps the head within
+    `limit` characters. Returns (head, tail); head is empty if not even the
+    first sentence fits.
+    """
+    head_end = 0
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        if match.start() > limit:
+            break
+        head_end = match.start()
+    if not head_end:
+        return "", text
+    return text[:head_end], text[head_end:].lstrip()
+
+def build_layout_chunks(units, pdf_path, total_pages):
+    """
+    Packs layout units into chunks of at most CHUNK_SIZE characters.
+    A heading starts a new chunk once the current one holds at least
+    LAYOUT_MIN_CHUNK_SIZE characters; shorter sections are merged with the
+    following ones, and such a chunk keeps the heading_path of its first
+    section. A paragraph that does not fit is split at a sentence boundary
+    to fill the current chunk. Tables and code blocks are kept whole (up to
+    LAYOUT_MAX_ATOMIC_CHUNK_SIZE) together with the headings directly above
+    them; overlap is only applied when a single paragraph is longer than
+    CHUNK_SIZE and has to be cut.
+    """
+    from langchain_core.documents import Document
+
+    overflow_splitter = _create_text_splitter()
+    chunks = []
+    buffer = []  # list of units waiting to be packed
+
+    def make_chunk(text, page, heading_path, chunk_type, last_page=None):
+        chunks.append(Document(
+            page_content=text,
+            metadata={
+                "source": pdf_path,
+                "file_path": pdf_path,
+                "page": page,
+                "last_page": page if last_page is None else last_page,
+                "total_pages": total_pages,
+                "heading_path": heading_path,
+                "chunk_type": chunk_type,
+            },
+        ))
+
+    def flush():
+        if buffer:
+            text = "\n\n".join(u["text"] for u in buffer)
+            make_chunk(text, buffer[0]["page"], buffer[0]["heading_path"], "text", last_page=buffer[-1]["page"])
+            buffer.clear()
+
+    def buffer_size():
+        return sum(len(u["text"]) + 2 for u in buffer)
+
+    for unit in units:
+        if unit["type"] == "heading":
+            # Consecutive headings and very short sections are merged forward
+            # rather than emitted as near-empty chunks.
+            if buffer_size() >= config.LAYOUT_MIN_CHUNK_SIZE:
+                flush()
+            buffer.append(unit)
+            continue
+
+        if unit["type"] in ("table", "code"):
+            # Headings directly above a table/code block belong with it, even
+            # when earlier (short) sections are still waiting in the buffer
+            headings = []
+            while buffer and buffer[-1]["type"] == "heading":
+                headings.insert(0, buffer.pop())
+            prefix = "".join(u["text"] + "\n\n" for u in headings)
+            flush()
+            for piece in _split_atomic(unit["text"], config.LAYOUT_MAX_ATOMIC_CHUNK_SIZE):
+                make_chunk(prefix + piece, unit["page"], unit["heading_path"], unit["type"])
+                prefix = ""
+            continue
+
+        if buffer and buffer_size() + len(unit["text"]) > config.CHUNK_SIZE:
+            # Fill the current chunk with the paragraph's leading sentences
+            head, tail = _split_at_sentence(unit["text"], config.CHUNK_SIZE - buffer_size())
+            if head:
+                buffer.append({**unit, "text": head})
+                unit = {**unit, "text": tail}
+            flush()
+            if not unit["text"]:
+                continue
+
+        if len(unit["text"]) > config.CHUNK_SIZE:
+            flush()
+            pieces = overflow_splitter.split_text(unit["text"])
+            for piece in pieces[:-1]:
+                make_chunk(piece, unit["page"], unit["heading_path"], "text")
+            # The last piece may share a chunk with the following paragraphs
+            buffer.append({**unit, "text": pieces[-1]})
+        else:
+            buffer.append(unit)
+
+    flush()
+    return chunks
+
+def load_and_split_document(path, logger=print, mime_type=None):
+    """
+    Splits any supported document into chunks. PDFs go through the PDF
+    pipeline; other formats stream units from their registered parser in
+    document_loaders into the same chunk packing. Directories and archives
+    are split file by file in parallel.
+    """
+    if document_loaders.is_collection(path):
+        return split_collection(path, logger=logger)
+
+    format_name = document_loaders.detect_format(path, mime_type)
+    if format_name is None:
+        raise ValueError(f"Unsupported document type: {os.path.basename(path)}")
+    if format_name == "pdf":
+        return load_and_split_pdf(path, logger=logger)
+
+    logger(f"--- Parsing {format_name} document ---")
+    units = document_loaders.with_heading_paths(document_loaders.iter_units(path, format_name))
+    chunks = build_layout_chunks(units, path, total_pages=1)
+    logger(f"Split the document into {len(chunks)} chunks.\n")
+    return chunks
+
+def _split_file(path):
+    """Process-pool worker: chunks one file."""
+    return load_and_split_document(path, logger=_discard)
+
+def split_collection(path, logger=print):
+    """
+    Chunks every supported file in a directory or archive using a process
+    pool of INGEST_WORKERS. Chunk sources are recorded relative to the
+    collection root. Files that fail to parse are logged and skipped.
+    """
+    with document_loaders.open_collection(path) as files:
+        workers = _ingest_workers(len(files))
+        logger(f"--- Splitting {len(files)} documents with {workers} worker process(es) ---")
+        results = {}
+        with page_analysis.process_pool(workers) as executor:
+            futures = {executor.submit(_split_file, file_path): name for file_path, name in files}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logger(f"Skipping {name}: {e}")
+                    continue
+                logger(f"{name}: {len(results[name])} chunks")
+
+        chunks = []
+        for _, name in files:
+            for chunk in results.get(name, []):
+                chunk.metadata["source"] = name
+                chunk.metadata["file_path"] = name
+                chunks.append(chunk)
+    logger(f"Split {len(results)} documents into {len(chunks)} chunks.\n")
+    return chunks
+
 def load_and_split_pdf(pdf_path, logger=print):
     """
     Loads a PDF document and splits it into chunks.
     Uses a provided logger for output.
     """
+    page_report, ocr_texts = None, {}
+    if config.PAGE_FILTER_ENABLED:
+        logger("--- Checking pages for missing, scanned or repeated content ---")
+        page_report = page_analysis.analyze_pages(pdf_path, logger=logger)
+        ocr_texts = page_analysis.ocr_pages(pdf_path, page_report["ocr"], logger=logger)
+
+    if config.CHUNKING_STRATEGY == "layout":
+        logger("--- Analysing PDF layout ---")
+        units, total_pages = extract_layout_units(
+            pdf_path, logger=logger, page_report=page_report, ocr_texts=ocr_texts
+        )
+        logger(f"Found {len(units)} layout blocks across {total_pages} pages.\n")
+
+        logger("--- Splitting documents into structure-aware chunks ---")
+        chunks = build_layout_chunks(units, pdf_path, total_pages)
+        logger(f"Split the {total_pages} pages into {len(chunks)} chunks.\n")
+        return chunks
+
     logger("--- Loading PDF ---")
-    loader = PyMuPDFLoader(pdf_path)
-    docs = loader.load()
+    docs = _load_pdf_pages(pdf_path)
     logger(f"PDF loaded into {len(docs)} documents (pages).\n")
+    if page_report:
+        docs = _filter_pages(docs, page_report, ocr_texts)
 
     logger("--- Splitting documents into chunks ---")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=config.CHUNK_SIZE, chunk_overlap=config.CHUNK_OVERLAP
-    )
+    text_splitter = _create_text_splitter()
     chunks = text_splitter.split_documents(docs)
+    chunks = [c for c in chunks if any(ch.isalnum() for ch in c.page_content)]
     logger(f"Split the {len(docs)} pages into {len(chunks)} chunks.\n")
-    return chunks
\ No newline at end of file
+    return chunks
+
+def _filter_pages(docs, page_report, ocr_texts):
+    """
+    Applies a page report to per-page Documents: drops skipped pages, swaps
+    in OCR text for scanned pages and strips repeated header/footer lines
+    from the margin bands.
+    """
+    kept = []
+    for i, doc in enumerate(docs):
+        page_number = doc.metadata.get("page", i)
+        if page_number in ocr_texts:
+            doc.page_content = ocr_texts[page_number]
+        elif page_number in page_report["skip"] or page_number in page_report["ocr"]:
+            continue
+        elif page_number in page_report["margin_boilerplate"]:
+            # Only lines found in the header/footer bands; the same text in the
+            # body (a "6" in a table when the footer is a page number) is kept
+            doc.page_content = page_analysis.strip_margin_lines(
+                doc.page_content, page_report["margin_boilerplate"][page_number]
+            )
+        kept.append(doc)
+    return kept
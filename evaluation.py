@@ -0,0 +1,290 @@
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import config
+
+DEFAULT_EVAL_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_sets", "attention.json")
+INDEX_TYPES = ("float", "int8", "binary")
+
+def _quiet(message):
+    pass
+
+@contextlib.contextmanager
+def config_overrides(**values):
+    """Temporarily sets config constants, restoring the previous values afterwards."""
+    previous = {name: getattr(config, name) for name in values}
+    for name, value in values.items():
+        setattr(config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(config, name, value)
+
+def load_eval_set(path):
+    """Loads a labelled evaluation set: {"document": ..., "questions": [{question, relevant_pages, evidence}]}."""
+    with open(path, encoding="utf-8") as f:
+        eval_set = json.load(f)
+    for item in eval_set["questions"]:
+        if not item.get("question") or not item.get("relevant_pages"):
+            raise ValueError(f"Evaluation item needs a question and relevant_pages: {item}")
+    return eval_set
+
+def check_labels(pdf_path, eval_set, logger=print):
+    """
+    Warns about labels whose evidence phrase does not appear on any of the
+    labelled pages, e.g. after the document or the set has been edited.
+    Returns the number of suspicious labels.
+    """
+    import document_processor
+
+    if not pdf_path.lower().endswith(".pdf"):
+        return 0
+    pages = [" ".join(doc.page_content.lower().split()) for doc in document_processor._load_pdf_pages(pdf_path)]
+    problems = 0
+    for item in eval_set["questions"]:
+        evidence = item.get("evidence", "").lower()
+        if not evidence:
+            continue
+        found = [i for i, text in enumerate(pages) if evidence in text]
+        if not set(found) & set(item["relevant_pages"]):
+            logger(f"Label check: '{evidence}' found on pages {found}, labelled {item['relevant_pages']}: {item['question']}")
+            problems += 1
+    return problems
+
+class ExactVectorStore:
+    """
+    In-memory brute-force float32 search. The quality baseline the compact
+    indexes are compared against; exposes the same `similarity_search`.
+    """
+
+    def __init__(self, vectors, documents, embedding_function, dimensions=None):
+        import numpy as np
+
+        self._np = np
+        self.dimensions = dimensions
+        vectors = np.asarray(vectors, dtype=np.float32)[:, :dimensions]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.vectors = vectors / norms
+        self.documents = documents
+        self.embedding_function = embedding_function
+
+    def similarity_search(self, query, k=4):
+        query_vector = self._np.asarray(self.embedding_function.embed_query(query), dtype=self._np.float32)[:self.dimensions]
+        scores = self.vectors @ query_vector
+        return [self.documents[i] for i in self._np.argsort(-scores)[:k]]
+
+def embed_chunks(embedding_function, chunks, logger=print):
+    """
+    Embeds chunk texts in batches of EMBEDDING_BATCH_SIZE, waiting
+    RATE_LIMIT_DELAY between batches like the store build does.
+    """
+    import vector_store_manager
+
+    texts = [c.page_content for c in chunks]
+    vectors = []
+    for i, batch in enumerate(vector_store_manager.get_batch(texts, config.EMBEDDING_BATCH_SIZE)):
+        vectors.extend(embedding_function.embed_documents(batch))
+        if (i + 1) * config.EMBEDDING_BATCH_SIZE < len(texts) and config.MODEL_BACKEND != "stub":
+            logger(f"Waiting for {config.RATE_LIMIT_DELAY} seconds before the next batch...")
+            time.sleep(config.RATE_LIMIT_DELAY)
+    return vectors
+
+def build_indexes(chunks, vectors, embedding_function, index_types, dimensions_options, work_dir):
+    """
+    Builds one searchable store per (index type, dimensions) over the same
+    chunk embeddings. Returns {(index_type, dimensions): store}.
+    """
+    import compact_index
+
+    stores = {}
+    for index_type in index_types:
+        for dimensions in dimensions_options:
+            if index_type == "float":
+                stores[index_type, dimensions] = ExactVectorStore(vectors, chunks, embedding_function, dimensions)
+                continue
+            index_dir = tempfile.mkdtemp(prefix=f"{index_type}-", dir=work_dir)
+            compact_index.build_compact_index(
+                index_dir, vectors,
+                [c.page_content for c in chunks], [c.metadata for c in chunks],
+                dimensions=dimensions, quantization=index_type, logger=_quiet,
+            )
+            stores[index_type, dimensions] = compact_index.CompactVectorStore(index_dir, embedding_function)
+    return stores
+
+def score_retrieval(docs, relevant_pages):
+    """
+    Returns (hit, reciprocal rank) for one question. A question counts as
+    recalled when any retrieved chunk covers one of its relevant pages
+    (from `page` to `last_page` for chunks that span pages).
+    """
+    for rank, doc in enumerate(docs, start=1):
+        first_page = doc.metadata.get("page")
+        last_page = doc.metadata.get("last_page", first_page)
+        if first_page is not None and any(first_page <= page <= last_page for page in relevant_pages):
+            return 1, 1.0 / rank
+    return 0, 0.0
+
+def run_configuration(store, questions, k, rerank_candidates):
+    """Retrieves for every question with one (k, re-rank) setting and aggregates the metrics."""
+    import conversation_memory
+    import rag_handler
+
+    hits, reciprocal_ranks, tokens, latencies = [], [], [], []
+    with config_overrides(RERANK_CANDIDATES=rerank_candidates):
+        for item in questions:
+            start = time.perf_counter()
+            docs = rag_handler.retrieve_chunks(item["question"], store, k=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            hit, reciprocal_rank = score_retrieval(docs, item["relevant_pages"])
+            hits.append(hit)
+            reciprocal_ranks.append(reciprocal_rank)
+            context = "\n\n".join(doc.page_content for doc in docs)
+            tokens.append(conversation_memory.estimate_tokens(context + "\n" + item["question"]))
+
+    return {
+        "recall": statistics.mean(hits),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "prompt_tokens": statistics.mean(tokens),
+        "latency_ms": statistics.median(latencies),
+    }
+
+def evaluate(pdf_path, eval_set, strategies, chunk_sizes, overlaps, ks, rerank_options, index_types,
+             dimensions_options=(None,), logger=print):
+    """
+    Sweeps chunking strategy x chunk size x overlap x index type x embedding
+    dimensions x re-ranking x k over the labelled questions. Each chunking is embedded once and shared by
+    every index and retrieval setting. Returns a list of result rows.
+    """
+    import document_processor
+    import vector_store_manager
+
+    embedding_function = vector_store_manager.get_embeddings()
+    questions = eval_set["questions"]
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for strategy in strategies:
+            for chunk_size in chunk_sizes:
+                for overlap in overlaps:
+                    if overlap >= chunk_size:
+                        continue
+                    with config_overrides(CHUNKING_STRATEGY=strategy, CHUNK_SIZE=chunk_size, CHUNK_OVERLAP=overlap):
+                        chunks = document_processor.load_and_split_document(pdf_path, logger=_quiet)
+                    logger(f"--- {strategy}, size {chunk_size}, overlap {overlap}: {len(chunks)} chunks ---")
+                    vectors = embed_chunks(embedding_function, chunks, logger=logger)
+                    stores = build_indexes(chunks, vectors, embedding_function, index_types, dimensions_options, work_dir)
+
+                    for (index_type, dimensions), store in stores.items():
+                        for rerank_candidates in rerank_options:
+                            for k in ks:
+                                metrics = run_configuration(store, questions, k, rerank_candidates)
+                                rows.append({
+                                    "chunking": strategy,
+                                    "chunk_size": chunk_size,
+                                    "overlap": overlap,
+                                    "chunks": len(chunks),
+                                    "index": index_type,
+                                    "dimensions": dimensions,
+                                    "rerank": rerank_candidates,
+                                    "k": k,
+                                    **metrics,
+                                })
+    return rows
+
+def is_current_config(row):
+    """True if a result row matches the settings currently in config.py."""
+    current_index = config.COMPACT_INDEX_QUANTIZATION if config.VECTOR_INDEX_FORMAT == "compact" else "float"
+    return (
+        row["chunking"] == config.CHUNKING_STRATEGY
+        and row["chunk_size"] == config.CHUNK_SIZE
+        and row["overlap"] == config.CHUNK_OVERLAP
+        and row["index"] == current_index
+        and row["dimensions"] == config.COMPACT_INDEX_DIMENSIONS
+        and row["rerank"] == config.RERANK_CANDIDATES
+        and row["k"] == config.SIMILARITY_SEARCH_K
+    )
+
+def format_results(rows, question_count):
+    """Renders result rows as a fixed-width table, best recall (then cheapest prompt) first."""
+    header = (f"  {'chunking':<9} {'size':>5} {'overlap':>7} {'chunks':>6} {'index':<6} {'dims':>5} {'rerank':>6} {'k':>2}"
+              f" {'recall@k':>8} {'MRR':>5} {'tokens':>6} {'ms':>6}")
+    lines = [f"Retrieval evaluation over {question_count} questions (* = current config.py settings)", header]
+    for row in sorted(rows, key=lambda r: (-r["recall"], -r["mrr"], r["prompt_tokens"])):
+        marker = "*" if is_current_config(row) else " "
+        lines.append(
+            f"{marker} {row['chunking']:<9} {row['chunk_size']:>5} {row['overlap']:>7} {row['chunks']:>6}"
+            f" {row['index']:<6} {row['dimensions'] or '-':>5} {row['rerank'] or '-':>6} {row['k']:>2}"
+            f" {row['recall']:>8.2f} {row['mrr']:>5.2f} {row['prompt_tokens']:>6.0f} {row['latency_ms']:>6.2f}"
+        )
+    return "\n".join(lines)
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+def _rerank_list(value):
+    return [None if v in ("none", "0") else int(v) for v in value.split(",") if v]
+
+def _dimensions_list(value):
+    return [None if v in ("full", "none") else int(v) for v in value.split(",") if v]
+
+def main():
+    """Runs the retrieval sweep from the command line and prints the comparison table."""
+    parser = argparse.ArgumentParser(description="Measure retrieval recall, MRR, prompt size and latency across settings.")
+    parser.add_argument("pdf_path", nargs="?", help="Document to evaluate (defaults to the eval set's document)")
+    parser.add_argument("--eval-set", default=DEFAULT_EVAL_SET, help="Labelled question set (JSON)")
+    parser.add_argument("--backend", choices=["stub", "google"], default="stub",
+                        help="Embedding backend; 'stub' runs offline without an API key")
+    parser.add_argument("--chunking", default="layout,recursive", help="Comma-separated chunking strategies")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[500, 1000, 1500])
+    parser.add_argument("--overlaps", type=_int_list, default=[config.CHUNK_OVERLAP])
+    parser.add_argument("--k", type=_int_list, default=[1, 3, 5])
+    parser.add_argument("--rerank", type=_rerank_list, default=[None, 20],
+                        help="Re-rank candidate pool sizes; 'none' disables re-ranking")
+    parser.add_argument("--index", default=",".join(INDEX_TYPES), help=f"Comma-separated index types: {', '.join(INDEX_TYPES)}")
+    parser.add_argument("--dimensions", type=_dimensions_list, default=[config.COMPACT_INDEX_DIMENSIONS],
+                        help="Embedding dimensions to truncate to; 'full' keeps all")
+    parser.add_argument("--output", help="Also write the result rows to this JSON file")
+    args = parser.parse_args()
+
+    eval_set = load_eval_set(args.eval_set)
+    pdf_path = args.pdf_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), eval_set["document"])
+    index_types = [t for t in args.index.split(",") if t]
+    unknown = set(index_types) - set(INDEX_TYPES)
+    if unknown:
+        parser.error(f"Unknown index type(s): {', '.join(sorted(unknown))}")
+    if not os.path.exists(pdf_path):
+        parser.error(f"Document not found: {pdf_path}")
+
+    check_labels(pdf_path, eval_set)
+    with config_overrides(MODEL_BACKEND=args.backend):
+        rows = evaluate(
+            pdf_path, eval_set,
+            strategies=[s for s in args.chunking.split(",") if s],
+            chunk_sizes=args.chunk_sizes,
+            overlaps=args.overlaps,
+            ks=args.k,
+            rerank_options=args.rerank,
+            index_types=index_types,
+            dimensions_options=args.dimensions,
+        )
+
+    print()
+    print(format_results(rows, len(eval_set["questions"])))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -1,39 +1,34 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-import os
-from dotenv import load_dotenv
+import argparse
 
-import config
-import vector_store_manager
+import conversation_memory
 import rag_handler
-
-def initialize_llm():
-    """Initializes and returns the Generative AI model."""
-    load_dotenv()
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
-        raise ValueError("GOOGLE_API_KEY not found in environment variables.")
-    
-    return ChatGoogleGenerativeAI(
-        model=config.LLM_MODEL_NAME,
-        google_api_key=google_api_key,
-        temperature=0,
-        max_retries=2,
-    )
+import warmup
 
 def main():
     """Main function to run the RAG application."""
-    llm = initialize_llm()
-    vectordb = vector_store_manager.load_or_create_vector_store()
-    
+    parser = argparse.ArgumentParser(description="Ask questions about a document from the command line.")
+    parser.add_argument("pdf_path", help="Path to a document (PDF, HTML, Markdown, reST, man page), directory or archive")
+    args = parser.parse_args()
+
+    # The store and the text load in the background while the LLM client starts
+    document_warmup = warmup.DocumentWarmup(args.pdf_path, logger=print)
+    llm = rag_handler.initialize_llm()
+    vectordb = document_warmup.vector_store()
+    full_text = document_warmup.full_text()
+    memory = conversation_memory.ConversationMemory()
+
     # Start the interactive Q&A loop
-    print("--- Ready to answer questions from the PDF. Type 'exit' to quit. ---")
+    print("--- Ready to answer questions from the document. Type 'exit' to quit. ---")
     while True:
         user_query = input("\nPlease enter your question: ")
         if user_query.lower() == 'exit':
             print("Exiting application.")
             break
         if user_query:
-            rag_handler.get_rag_response(user_query, vectordb, llm)
+            response, _ = rag_handler.get_rag_response(
+                user_query, vectordb, llm, full_text, memory=memory
+            )
+            print(f"\n{response}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,172 @@
+import os
+import hashlib
+import multiprocessing
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import config
+
+DIGITS_PATTERN = re.compile(r"\d+")
+
+def normalize_line(text):
+    """Canonical form used to spot repeated headers/footers ("Page 3 of 10" == "Page 7 of 10")."""
+    return " ".join(DIGITS_PATTERN.sub("#", text.lower()).split())
+
+def in_margin(bbox, page_height):
+    """True if a block lies in the header or footer band of the page."""
+    band = page_height * config.PAGE_MARGIN_FRACTION
+    return bbox[3] <= band or bbox[1] >= page_height - band
+
+def _image_coverage(page):
+    """Fraction of the page area covered by images, capped at 1."""
+    page_area = page.rect.width * page.rect.height
+    if not page_area:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        x0, y0, x1, y1 = info["bbox"]
+        covered += max(0.0, x1 - x0) * max(0.0, y1 - y0)
+    return min(1.0, covered / page_area)
+
+def analyze_pages(pdf_path, logger=print):
+    """
+    Cheap pre-embedding pass over a PDF's text layer. Returns a dict with:
+    - 'boilerplate': normalized header/footer lines repeated across pages
+    - 'margin_boilerplate': {page_number: {"header": [...], "footer": [...]}},
+      the raw boilerplate lines found in each page's top and bottom bands
+    - 'skip': {page_number: reason} for empty, low-text and duplicate pages
+    - 'ocr': page numbers that look scanned (image-only) and need OCR
+    """
+    import pymupdf
+
+    pages = []
+    margin_counts = Counter()
+    with pymupdf.open(pdf_path) as pdf:
+        for page in pdf:
+            blocks = [b for b in page.get_text("blocks") if b[6] == 0 and b[4].strip()]
+            margin_lines = {
+                normalize_line(line)
+                for b in blocks if in_margin(b[:4], page.rect.height)
+                for line in b[4].splitlines() if line.strip()
+            }
+            margin_counts.update(margin_lines)
+            pages.append({
+                "blocks": blocks,
+                "height": page.rect.height,
+                "image_coverage": _image_coverage(page),
+            })
+
+    min_repeats = max(config.PAGE_BOILERPLATE_MIN_PAGES, len(pages) * config.PAGE_BOILERPLATE_MIN_FRACTION)
+    boilerplate = {line for line, count in margin_counts.items() if count >= min_repeats}
+
+    margin_boilerplate = {}
+    for page_number, page in enumerate(pages):
+        found = {"header": [], "footer": []}
+        for b in page["blocks"]:
+            if not in_margin(b[:4], page["height"]):
+                continue
+            band = "header" if b[3] <= page["height"] / 2 else "footer"
+            found[band].extend(
+                line.strip() for line in b[4].splitlines()
+                if line.strip() and normalize_line(line) in boilerplate
+            )
+        if found["header"] or found["footer"]:
+            margin_boilerplate[page_number] = found
+
+    skip, ocr, seen_hashes = {}, [], {}
+    for page_number, page in enumerate(pages):
+        lines = [
+            line for b in page["blocks"] for line in b[4].splitlines()
+            if line.strip() and not (in_margin(b[:4], page["height"]) and normalize_line(line) in boilerplate)
+        ]
+        text = " ".join(" ".join(lines).split())
+
+        if len(text) < config.PAGE_MIN_TEXT_CHARS:
+            if page["image_coverage"] >= config.PAGE_SCAN_IMAGE_COVERAGE:
+                ocr.append(page_number)
+            else:
+                skip[page_number] = "empty" if not text else "low text"
+            continue
+
+        # Digits are significant here: pages differing only in numbers are not duplicates
+        page_hash = hashlib.md5(text.lower().encode("utf-8")).hexdigest()
+        if page_hash in seen_hashes:
+            skip[page_number] = f"duplicate of page {seen_hashes[page_hash] + 1}"
+        else:
+            seen_hashes[page_hash] = page_number
+
+    for page_number, reason in sorted(skip.items()):
+        logger(f"Skipping page {page_number + 1}: {reason}")
+    if boilerplate:
+        logger(f"Removing {len(boilerplate)} repeated header/footer line(s).")
+    if ocr:
+        logger(f"{len(ocr)} page(s) look scanned and have no usable text layer.")
+
+    return {"boilerplate": boilerplate, "margin_boilerplate": margin_boilerplate, "skip": skip, "ocr": ocr}
+
+def strip_margin_lines(text, margin_lines):
+    """
+    Removes a page's header/footer boilerplate from its plain text: each
+    header line at its first occurrence, each footer line at its last, so the
+    same text in the body (e.g. a table value equal to the page number) stays.
+    """
+    lines = text.splitlines()
+    for target in margin_lines.get("header", []):
+        for i, line in enumerate(lines):
+            if line.strip() == target:
+                del lines[i]
+                break
+    for target in margin_lines.get("footer", []):
+        for i in range(len(lines) - 1, -1, -1):
+            if lines[i].strip() == target:
+                del lines[i]
+                break
+    return "\n".join(lines)
+
+def _ocr_page(pdf_path, page_number):
+    """Runs Tesseract OCR (through PyMuPDF) on one page. Executed in a worker process."""
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as pdf:
+        page = pdf[page_number]
+        textpage = page.get_textpage_ocr(language=config.OCR_LANGUAGE, dpi=config.OCR_DPI, full=True)
+        return page.get_text(textpage=textpage)
+
+def process_pool(workers):
+    """
+    Process pool whose workers are started fresh (forkserver, or spawn where
+    that is unavailable) rather than forked from this possibly multi-threaded
+    process, which can deadlock on locks held by other threads.
+    """
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+
+def ocr_pages(pdf_path, page_numbers, logger=print):
+    """
+    OCRs the given pages in a local CPU process pool and returns
+    {page_number: text}. Pages that fail (e.g. Tesseract is not installed)
+    are left out. Does nothing unless OCR_ENABLED is set.
+    """
+    if not page_numbers:
+        return {}
+    if not config.OCR_ENABLED:
+        logger(f"OCR is disabled; skipping {len(page_numbers)} scanned page(s).")
+        return {}
+
+    workers = min(len(page_numbers), config.OCR_WORKERS or os.cpu_count() or 1)
+    logger(f"--- Running OCR on {len(page_numbers)} page(s) with {workers} worker(s) ---")
+    results = {}
+    with process_pool(workers) as executor:
+        futures = {executor.submit(_ocr_page, pdf_path, n): n for n in page_numbers}
+        for future in as_completed(futures):
+            page_number = futures[future]
+            try:
+                text = future.result().strip()
+            except Exception as e:
+                logger(f"OCR failed for page {page_number + 1}: {e}")
+                continue
+            if len(text) >= config.PAGE_MIN_TEXT_CHARS:
+                results[page_number] = text
+    logger(f"OCR recovered text from {len(results)} page(s).\n")
+    return results
@@ -0,0 +1,106 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+from conversation_memory import estimate_tokens
+
+# {(model, prefix hash): {"name": cache name or None, "expires_at": timestamp}},
+# or {"creating": Future} while the first request for a prefix creates it
+_cache_registry = {}
+_registry_lock = threading.Lock()
+
+def build_prompt(prefix, suffix):
+    """
+    Joins a prompt so the stable part (instructions and document context)
+    comes first and the per-request part (history and question) last.
+    Identical prefixes are what both explicit and implicit provider-side
+    caching key on.
+    """
+    return prefix + suffix
+
+def _prefix_key(llm, prefix):
+    model = getattr(llm, "model", None) or getattr(llm, "model_name", "")
+    return model, hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+def _supports_explicit_cache(llm):
+    client = getattr(llm, "client", None)
+    return client is not None and hasattr(client, "caches")
+
+def _create_cached_content(llm, prefix):
+    """Creates a provider-side cached content entry holding the prefix. Returns its name."""
+    from google.genai import types
+
+    cache = llm.client.caches.create(
+        model=llm.model,
+        config=types.CreateCachedContentConfig(
+            contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+            ttl=f"{config.CONTEXT_CACHE_TTL_SECONDS}s",
+        ),
+    )
+    return cache.name
+
+def get_cached_content(llm, prefix, logger=print):
+    """
+    Returns the name of a live cached-content handle for this prefix,
+    creating one if needed, or None when caching is disabled, the prefix is
+    too short to qualify, or the provider refused. Failures are remembered
+    for CONTEXT_CACHE_RETRY_SECONDS so they are not retried on every call.
+    """
+    if not config.CONTEXT_CACHE_ENABLED or not _supports_explicit_cache(llm):
+        return None
+    if estimate_tokens(prefix) < config.CONTEXT_CACHE_MIN_TOKENS:
+        return None
+
+    key = _prefix_key(llm, prefix)
+    now = time.time()
+    with _registry_lock:
+        for stale_key in [k for k, e in _cache_registry.items() if e.get("expires_at", now + 1) <= now]:
+            del _cache_registry[stale_key]
+        entry = _cache_registry.get(key)
+        if entry and "creating" not in entry:
+            return entry["name"]
+        pending = entry["creating"] if entry else None
+        if pending is None:
+            creating = Future()
+            _cache_registry[key] = {"creating": creating}
+
+    # The provider call runs outside the lock so other prefixes are not held
+    # up; concurrent requests for this prefix wait for the same creation.
+    if pending is not None:
+        return pending.result()
+
+    try:
+        name = _create_cached_content(llm, prefix)
+        # Expire locally a little before the provider does
+        expires_at = time.time() + config.CONTEXT_CACHE_TTL_SECONDS * 0.9
+        logger(f"--- Created context cache for {estimate_tokens(prefix)} prompt tokens ---")
+    except Exception as e:
+        name = None
+        expires_at = time.time() + config.CONTEXT_CACHE_RETRY_SECONDS
+        logger(f"Context caching unavailable, sending the full prompt: {e}")
+    with _registry_lock:
+        _cache_registry[key] = {"name": name, "expires_at": expires_at}
+    creating.set_result(name)
+    return name
+
+def invalidate(llm, prefix):
+    """Forgets the cached-content handle for a prefix."""
+    with _registry_lock:
+        _cache_registry.pop(_prefix_key(llm, prefix), None)
+
+def invoke_with_prefix(llm, prefix, suffix, logger=print):
+    """
+    Invokes the LLM on prefix + suffix. When a cached-content handle exists
+    for the prefix, only the suffix is sent; if the provider rejects the
+    handle (e.g. it expired early), the full prompt is sent instead.
+    """
+    cache_name = get_cached_content(llm, prefix, logger=logger)
+    if cache_name:
+        try:
+            return llm.invoke(suffix, cached_content=cache_name)
+        except Exception as e:
+            logger(f"Cached context rejected, resending the full prompt: {e}")
+            invalidate(llm, prefix)
+    return llm.invoke(build_prompt(prefix, suffix))
@@ -1,4 +1,73 @@
+import math
+import os
+import re
+
 import config
+import prompt_cache
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def initialize_llm():
+    """
+    Creates the chat model for the configured MODEL_BACKEND. Raises
+    ValueError when the Google backend is selected without GOOGLE_API_KEY.
+    """
+    if config.MODEL_BACKEND == "stub":
+        import stub_models
+        return stub_models.StubChatModel()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        raise ValueError("GOOGLE_API_KEY not found in environment variables.")
+
+    # Imported here so that importing this module stays fast
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=config.LLM_MODEL_NAME,
+        google_api_key=google_api_key,
+        temperature=0,
+        max_retries=2,
+    )
+
+def rerank_lexical(query, docs):
+    """
+    Re-orders vector search results by fusing their vector rank with a
+    lexical rank (query-term overlap, weighted by rarity across the
+    candidates) using reciprocal rank fusion.
+    """
+    query_terms = {t for t in TOKEN_PATTERN.findall(query.lower()) if len(t) > 2}
+    if not query_terms or len(docs) < 2:
+        return list(docs)
+
+    doc_terms = [TOKEN_PATTERN.findall(doc.page_content.lower()) for doc in docs]
+    doc_freq = {t: sum(1 for terms in doc_terms if t in terms) for t in query_terms}
+    lexical_scores = []
+    for terms in doc_terms:
+        counts = {t: terms.count(t) for t in query_terms}
+        lexical_scores.append(sum(
+            math.log(1 + counts[t]) * math.log(1 + len(docs) / doc_freq[t])
+            for t in query_terms if counts[t]
+        ))
+
+    lexical_rank = {i: rank for rank, i in enumerate(sorted(range(len(docs)), key=lambda i: -lexical_scores[i]))}
+    fused = sorted(
+        range(len(docs)),
+        key=lambda i: -(1 / (config.RERANK_RRF_K + i) + 1 / (config.RERANK_RRF_K + lexical_rank[i])),
+    )
+    return [docs[i] for i in fused]
+
+def retrieve_chunks(query, vectordb, k=None):
+    """
+    Similarity search for the top-k chunks. With RERANK_CANDIDATES set, a
+    larger candidate pool is fetched and re-ranked lexically first.
+    """
+    k = k or config.SIMILARITY_SEARCH_K
+    if config.RERANK_CANDIDATES and config.RERANK_CANDIDATES > k:
+        candidates = vectordb.similarity_search(query, k=config.RERANK_CANDIDATES)
+        return rerank_lexical(query, candidates)[:k]
+    return vectordb.similarity_search(query, k=k)
 
 def get_query_intent(query: str, llm, logger=print) -> str:
     """
@@ -27,40 +96,104 @@ Category:"""
     logger(f"Detected intent: {final_intent}")
     return final_intent
 
-def get_rag_response(query, vectordb, llm, full_text, logger=print):
+def analyze_follow_up(query: str, llm, memory, logger=print):
+    """
+    For a message in an ongoing conversation, classifies its intent, rewrites
+    it into a standalone question and decides whether it stays on the previous
+    topic, all in a single LLM call so follow-ups cost no more than a first question.
+    Returns (intent, standalone_query, same_topic).
+    """
+    logger("--- Classifying intent and rewriting follow-up question ---")
+
+    analysis_prompt = f"""Your task is to analyse the latest user message in a conversation about a document.
+- 'general_query': Use for questions asking for a summary, overview, main points, or the overall purpose of the document.
+- 'specific_question': Use for questions asking about a specific detail, definition, concept, or fact within the document.
+
+Conversation so far:
+{memory.format_history()}
+
+Latest user message: "{query}"
+
+Do not answer the question. Reply with exactly three lines:
+Category: <general_query or specific_question>
+Standalone question: <the latest message rewritten so it can be understood without the conversation>
+Same topic: <yes if it is about the same subject as the previous question, otherwise no>"""
+
+    response = llm.invoke(analysis_prompt)
+    intent, standalone_query, same_topic = 'specific_question', query, False
+    for line in response.content.strip().splitlines():
+        label, _, value = line.partition(":")
+        label, value = label.strip().lower(), value.strip()
+        if label == "category" and 'general_query' in value.lower():
+            intent = 'general_query'
+        elif label == "standalone question" and value:
+            standalone_query = value
+        elif label == "same topic":
+            same_topic = value.lower().startswith("yes")
+
+    logger(f"Detected intent: {intent}")
+    logger(f"Standalone question: {standalone_query} (same topic: {'yes' if same_topic else 'no'})")
+    return intent, standalone_query, same_topic
+
+def _history_section(memory):
+    """Conversation context block for answer prompts; empty when there is no history."""
+    if memory is None or memory.is_empty():
+        return ""
+    return f"\nConversation so far:\n{memory.format_history()}\n"
+
+def get_rag_response(query, vectordb, llm, full_text, logger=print, memory=None):
     """
     Determines user intent via an LLM call and provides a response.
     - For specific questions, uses RAG to find relevant chunks.
     - For general requests, uses the full document text.
+    When a ConversationMemory is passed, follow-ups are rewritten into
+    standalone questions, answered with the bounded history, and reuse the
+    previous turn's chunks if the topic has not changed.
     """
-    intent = get_query_intent(query, llm, logger)
+    same_topic = False
+    if memory is not None and not memory.is_empty():
+        intent, query, same_topic = analyze_follow_up(query, llm, memory, logger)
+    else:
+        intent = get_query_intent(query, llm, logger)
+    history = _history_section(memory)
+
+    # Prompts are laid out as a stable prefix (instructions + document context)
+    # followed by the per-request suffix, so the prefix can be cached.
+    suffix_template = """{history}
+Question:
+{question}
+
+Answer:
+"""
+    suffix = suffix_template.format(history=history, question=query)
 
     if intent == 'general_query':
-        template = """
+        prefix_template = """
 You are a helpful assistant. Answer the user's question based on the full content of the document provided below.
 
 Document:
 {context}
-
-Question:
-{question}
-
-Answer:
 """
-        prompt = template.format(context=full_text, question=query)
+        prefix = prefix_template.format(context=full_text)
         logger("--- Generating answer from full document based on general intent ---")
-        response = llm.invoke(prompt)
+        response = prompt_cache.invoke_with_prefix(llm, prefix, suffix, logger=logger)
+        if memory is not None:
+            memory.add_turn(query, response.content, [], llm, logger)
         return response.content, [] # No specific sources for a general query
 
     else:
         # Standard RAG for specific questions
-        logger(f"\nSearching for relevant documents for specific question: '{query}'")
-        retrieved_docs = vectordb.similarity_search(query, k=config.SIMILARITY_SEARCH_K)
-        logger(f"Found {len(retrieved_docs)} relevant document chunks.\n")
+        if same_topic and memory.last_docs:
+            retrieved_docs = memory.last_docs
+            logger(f"Same topic as the previous question, reusing its {len(retrieved_docs)} document chunks.\n")
+        else:
+            logger(f"\nSearching for relevant documents for specific question: '{query}'")
+            retrieved_docs = retrieve_chunks(query, vectordb)
+            logger(f"Found {len(retrieved_docs)} relevant document chunks.\n")
 
         context = "\n\n".join([doc.page_content for doc in retrieved_docs])
 
-        template = """
+        prefix_template = """
 You are a helpful assistant. Your primary goal is to answer the user's question based on the provided context.
 
 1. First, carefully read the context below and try to answer the question using only this information.
@@ -70,16 +203,14 @@ You are a helpful assistant. Your primary goal is to answer the user's question
 
 Context:
 {context}
-
-Question:
-{question}
-
-Answer:
 """
-        prompt = template.format(context=context, question=query)
+        prefix = prefix_template.format(context=context)
         
         logger("--- Generating final answer from context chunks ---")
-        response = llm.invoke(prompt)
+        response = prompt_cache.invoke_with_prefix(llm, prefix, suffix, logger=logger)
         logger("--- Final answer generated ---")
+
+        if memory is not None:
+            memory.add_turn(query, response.content, retrieved_docs, llm, logger)
             
         return response.content, retrieved_docs
\ No newline at end of file
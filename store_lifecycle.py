@@ -0,0 +1,457 @@
+import os
+import argparse
+import contextlib
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+
+import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+
+CATALOG_FILENAME = "catalog.json"
+CATALOG_LOCK_FILENAME = "catalog.lock"
+CHROMA_SQLITE_FILENAME = "chroma.sqlite3"
+
+def _catalog_path():
+    return os.path.join(config.VECTOR_STORE_BASE_DIR, CATALOG_FILENAME)
+
+def load_catalog():
+    """Returns the store catalog: {store_hash: entry}."""
+    try:
+        with open(_catalog_path()) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_catalog(catalog):
+    """Writes the catalog atomically so a crash never leaves it half-written."""
+    os.makedirs(config.VECTOR_STORE_BASE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=CATALOG_FILENAME, suffix=".tmp", dir=config.VECTOR_STORE_BASE_DIR)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(catalog, f, indent=2)
+        os.replace(tmp_path, _catalog_path())
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+_catalog_thread_lock = threading.Lock()
+
+@contextlib.contextmanager
+def catalog_transaction():
+    """
+    Loads the catalog under a lock and saves it when the block exits, so
+    concurrent read-modify-write cycles (threads, or processes on POSIX)
+    cannot lose each other's updates.
+    """
+    with _catalog_thread_lock:
+        os.makedirs(config.VECTOR_STORE_BASE_DIR, exist_ok=True)
+        with open(os.path.join(config.VECTOR_STORE_BASE_DIR, CATALOG_LOCK_FILENAME), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            catalog = load_catalog()
+            yield catalog
+            save_catalog(catalog)
+
+def get_dir_size(path):
+    """Total size in bytes of all files under path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+@contextlib.contextmanager
+def build_lock(store_hash):
+    """
+    Serializes building (and discarding a half-built) store for one content
+    hash: across threads, and on POSIX across processes through an flock on
+    <store_hash>.lock next to the store directories.
+    """
+    with _build_locks_guard:
+        thread_lock = _build_locks.setdefault(store_hash, threading.Lock())
+    with thread_lock:
+        os.makedirs(config.VECTOR_STORE_BASE_DIR, exist_ok=True)
+        with open(os.path.join(config.VECTOR_STORE_BASE_DIR, f"{store_hash}.lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+@contextlib.contextmanager
+def _try_lock(lock_path):
+    """Yields True if the lock file could be locked without waiting, False if a build holds it."""
+    with open(lock_path, "a") as lock_file:
+        if fcntl:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+
+def _remove_lock_file(lock_path):
+    """Deletes a build lock file unless a build currently holds it."""
+    with contextlib.suppress(OSError):
+        with _try_lock(lock_path) as free:
+            if free:
+                os.remove(lock_path)
+
+def _lock_paths(store_hash):
+    base_dir = config.VECTOR_STORE_BASE_DIR
+    return [os.path.join(base_dir, f"{store_hash}.lock"), os.path.join(base_dir, f"{store_hash}-compact.lock")]
+
+def _remove_orphans(store_names, now=None):
+    """
+    Deletes build lock files of stores that no longer exist and compact
+    index staging directories left behind by crashed builds (older than
+    STORE_PARTIAL_GRACE_SECONDS and not locked by a running build).
+    """
+    import compact_index
+
+    now = now or time.time()
+    base_dir = config.VECTOR_STORE_BASE_DIR
+    for name in os.listdir(base_dir):
+        if not name.endswith(".lock") or name == CATALOG_LOCK_FILENAME:
+            continue
+        store_hash = name[:-len(".lock")].removesuffix("-compact")
+        if store_hash not in store_names:
+            _remove_lock_file(os.path.join(base_dir, name))
+
+    staging_prefix = compact_index.INDEX_DIRNAME + "-"
+    for store_hash in store_names:
+        store_dir = os.path.join(base_dir, store_hash)
+        for name in os.listdir(store_dir):
+            staging_dir = os.path.join(store_dir, name)
+            if not name.startswith(staging_prefix) or not os.path.isdir(staging_dir):
+                continue
+            if now - os.path.getmtime(staging_dir) <= config.STORE_PARTIAL_GRACE_SECONDS:
+                continue
+            with _try_lock(_lock_paths(store_hash)[1]) as free:
+                if free:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+
+# Stores with a live handle in this process: {store_hash: open handle count}
+_open_handles = {}
+_open_handles_lock = threading.Lock()
+
+def _release_handle(store_hash):
+    with _open_handles_lock:
+        _open_handles[store_hash] -= 1
+        if not _open_handles[store_hash]:
+            del _open_handles[store_hash]
+
+def track_open(store_dir, vectordb):
+    """Marks a store as in use until the vectordb object is garbage collected."""
+    store_hash = os.path.basename(store_dir)
+    with _open_handles_lock:
+        _open_handles[store_hash] = _open_handles.get(store_hash, 0) + 1
+    weakref.finalize(vectordb, _release_handle, store_hash)
+
+def open_stores():
+    """Hashes of the stores with a live handle in this process."""
+    with _open_handles_lock:
+        return set(_open_handles)
+
+def is_complete_store(store_dir):
+    """A store is complete once its metadata file has been written (the last build step)."""
+    return os.path.exists(os.path.join(store_dir, config.METADATA_FILENAME))
+
+def source_fingerprint(path):
+    """
+    Cheap change check for a source: [modification time (ns), size], taken
+    over all files for a directory. Returns None if the source is gone.
+    """
+    try:
+        if not os.path.isdir(path):
+            stat = os.stat(path)
+            return [stat.st_mtime_ns, stat.st_size]
+        latest, total = os.stat(path).st_mtime_ns, 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                stat = os.stat(os.path.join(root, name))
+                latest, total = max(latest, stat.st_mtime_ns), total + stat.st_size
+        return [latest, total]
+    except OSError:
+        return None
+
+def record_access(store_dir, source_path):
+    """Updates last-access time, size and source (with its fingerprint) of a store in the catalog."""
+    store_hash = os.path.basename(store_dir)
+    size = get_dir_size(store_dir)
+    fingerprint = source_fingerprint(source_path)
+    with catalog_transaction() as catalog:
+        now = time.time()
+        entry = catalog.get(store_hash, {"created": now})
+        entry.update({
+            "source_name": os.path.basename(source_path),
+            "source_path": os.path.abspath(source_path),
+            "source_fingerprint": fingerprint,
+            "last_access": now,
+            "size_bytes": size,
+        })
+        catalog[store_hash] = entry
+
+def scan_stores():
+    """
+    Reconciles the catalog with the directories on disk. Untracked stores
+    are adopted using their modification time; entries whose directory has
+    disappeared are dropped, along with orphaned lock files and staging
+    directories. Returns the updated catalog.
+    """
+    base_dir = config.VECTOR_STORE_BASE_DIR
+    with catalog_transaction() as catalog:
+        on_disk = set()
+        for name in os.listdir(base_dir):
+            store_dir = os.path.join(base_dir, name)
+            if not os.path.isdir(store_dir):
+                continue
+            on_disk.add(name)
+            if name not in catalog:
+                mtime = os.path.getmtime(store_dir)
+                catalog[name] = {
+                    "created": mtime,
+                    "last_access": mtime,
+                    "source_name": None,
+                    "source_path": None,
+                    "size_bytes": get_dir_size(store_dir),
+                }
+            catalog[name]["complete"] = is_complete_store(store_dir)
+
+        for name in list(catalog):
+            if name not in on_disk:
+                del catalog[name]
+    _remove_orphans(on_disk)
+    return catalog
+
+def remove_store(store_hash, logger=print):
+    """Deletes a store directory, its catalog entry and its lock files. Returns bytes freed."""
+    store_dir = os.path.join(config.VECTOR_STORE_BASE_DIR, store_hash)
+    size = get_dir_size(store_dir)
+    try:
+        shutil.rmtree(store_dir)
+    except OSError as e:
+        # Typically a store that is still open by another process on Windows
+        logger(f"Could not remove store {store_hash}: {e}")
+        return 0
+
+    with catalog_transaction() as catalog:
+        catalog.pop(store_hash, None)
+    for lock_path in _lock_paths(store_hash):
+        if os.path.exists(lock_path):
+            _remove_lock_file(lock_path)
+    return size
+
+def plan_garbage_collection(catalog, keep=(), now=None, current_hashes=None):
+    """
+    Decides which stores to remove, returning [(store_hash, reason), ...].
+    Order of rules: partial builds, stores whose source file now hashes
+    differently (`current_hashes` maps absolute source paths to their current
+    hash), stores idle longer than the TTL, then least-recently-used stores
+    until the total size fits within the quota. Stores in `keep` are never removed.
+    """
+    now = now or time.time()
+    keep = set(keep)
+    victims = {}
+
+    for store_hash, entry in catalog.items():
+        if store_hash in keep:
+            continue
+        idle = now - entry["last_access"]
+        if not entry.get("complete", True) and idle > config.STORE_PARTIAL_GRACE_SECONDS:
+            victims[store_hash] = "partial"
+
+    # A store is superseded once the file it was built from has changed;
+    # stores of different files that merely share a name are unrelated
+    for store_hash, entry in catalog.items():
+        source = entry.get("source_path")
+        if source is None or store_hash in keep or store_hash in victims:
+            continue
+        current_hash = (current_hashes or {}).get(os.path.abspath(source))
+        if current_hash is not None and current_hash != store_hash:
+            victims[store_hash] = "superseded"
+
+    if config.STORE_TTL_DAYS is not None:
+        ttl_seconds = config.STORE_TTL_DAYS * 86400
+        for store_hash, entry in catalog.items():
+            if store_hash not in keep and store_hash not in victims and now - entry["last_access"] > ttl_seconds:
+                victims[store_hash] = "expired"
+
+    if config.STORE_QUOTA_BYTES is not None:
+        remaining = sorted(
+            (h for h in catalog if h not in victims),
+            key=lambda h: catalog[h]["last_access"],
+        )
+        total = sum(catalog[h]["size_bytes"] for h in remaining)
+        for store_hash in remaining:
+            if total <= config.STORE_QUOTA_BYTES:
+                break
+            if store_hash in keep:
+                continue
+            victims[store_hash] = "over quota"
+            total -= catalog[store_hash]["size_bytes"]
+
+    return list(victims.items())
+
+def find_stale_uploads(catalog, now=None):
+    """Uploaded files not referenced by any store and older than UPLOAD_TTL_DAYS."""
+    now = now or time.time()
+    upload_dir = config.UPLOAD_DIRECTORY
+    if config.UPLOAD_TTL_DAYS is None or not os.path.isdir(upload_dir):
+        return []
+
+    referenced = {
+        os.path.abspath(entry["source_path"]) for entry in catalog.values() if entry.get("source_path")
+    }
+    stale = []
+    for name in os.listdir(upload_dir):
+        path = os.path.join(upload_dir, name)
+        if not os.path.isfile(path) or os.path.abspath(path) in referenced:
+            continue
+        if now - os.path.getmtime(path) > config.UPLOAD_TTL_DAYS * 86400:
+            stale.append(path)
+    return stale
+
+def current_source_hashes(catalog):
+    """
+    Current content hash of every catalogued source that still exists:
+    {absolute path: hash}. A source whose fingerprint still matches the one
+    recorded for one of its stores is known to hash to that store; only
+    changed sources are re-hashed, and a re-hash that matches an existing
+    store refreshes that store's recorded fingerprint.
+    """
+    import vector_store_manager
+
+    stores_by_path = {}
+    for store_hash, entry in catalog.items():
+        if entry.get("source_path"):
+            stores_by_path.setdefault(os.path.abspath(entry["source_path"]), []).append(store_hash)
+
+    hashes, refreshed = {}, {}
+    for path, store_hashes in stores_by_path.items():
+        fingerprint = source_fingerprint(path)
+        if fingerprint is None:
+            continue
+        unchanged = [h for h in store_hashes if catalog[h].get("source_fingerprint") == fingerprint]
+        if unchanged:
+            hashes[path] = unchanged[0]
+            continue
+        try:
+            hashes[path] = vector_store_manager.get_source_hash(path)
+        except OSError:
+            continue
+        if hashes[path] in store_hashes:
+            refreshed[hashes[path]] = fingerprint
+
+    if refreshed:
+        with catalog_transaction() as latest:
+            for store_hash, fingerprint in refreshed.items():
+                if store_hash in latest:
+                    latest[store_hash]["source_fingerprint"] = fingerprint
+    return hashes
+
+def collect_garbage(keep=(), dry_run=False, logger=print):
+    """
+    Runs a garbage collection pass over vector stores and uploads.
+    Stores open in this process are never removed.
+    Returns the number of bytes freed (or that would be freed on a dry run).
+    """
+    catalog = scan_stores()
+    keep = set(keep) | open_stores()
+    freed = 0
+    plan = plan_garbage_collection(catalog, keep=keep, current_hashes=current_source_hashes(catalog))
+    for store_hash, reason in plan:
+        size = catalog[store_hash]["size_bytes"]
+        name = catalog[store_hash].get("source_name") or "unknown source"
+        logger(f"{'Would remove' if dry_run else 'Removing'} store {store_hash} ({name}, {size} bytes): {reason}")
+        freed += size if dry_run else remove_store(store_hash, logger=logger)
+
+    for path in find_stale_uploads(load_catalog()):
+        size = os.path.getsize(path)
+        logger(f"{'Would remove' if dry_run else 'Removing'} stale upload {path} ({size} bytes)")
+        if not dry_run:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger(f"Could not remove {path}: {e}")
+                continue
+        freed += size
+
+    logger(f"Garbage collection {'would free' if dry_run else 'freed'} {freed} bytes.")
+    return freed
+
+def vacuum_store(store_hash, logger=print):
+    """
+    Compacts a Chroma store's SQLite file, reclaiming pages left behind by
+    deleted or rewritten records. The store must not be open elsewhere.
+    Returns bytes reclaimed.
+    """
+    store_dir = os.path.join(config.VECTOR_STORE_BASE_DIR, store_hash)
+    sqlite_path = os.path.join(store_dir, CHROMA_SQLITE_FILENAME)
+    if not os.path.exists(sqlite_path):
+        return 0
+
+    before = get_dir_size(store_dir)
+    connection = sqlite3.connect(sqlite_path)
+    try:
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+    after = get_dir_size(store_dir)
+
+    with catalog_transaction() as catalog:
+        if store_hash in catalog:
+            catalog[store_hash]["size_bytes"] = after
+    logger(f"Vacuumed store {store_hash}: {before} -> {after} bytes")
+    return before - after
+
+def _format_entry(store_hash, entry):
+    last_access = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_access"]))
+    status = "" if entry.get("complete", True) else " [partial]"
+    return (f"{store_hash}  {entry['size_bytes'] / 1e6:8.1f} MB  {last_access}  "
+            f"{entry.get('source_name') or '-'}{status}")
+
+def main():
+    """Command-line interface to inspect and prune vector stores."""
+    parser = argparse.ArgumentParser(description="Inspect and prune vector stores.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List stores, most recently used first")
+    gc_parser = subparsers.add_parser("gc", help="Remove partial, superseded, expired and over-quota stores")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+    vacuum_parser = subparsers.add_parser("vacuum", help="Compact Chroma SQLite files")
+    vacuum_parser.add_argument("store", nargs="*", help="Store hashes (default: all)")
+    remove_parser = subparsers.add_parser("remove", help="Remove specific stores")
+    remove_parser.add_argument("store", nargs="+", help="Store hashes")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        catalog = scan_stores()
+        for store_hash, entry in sorted(catalog.items(), key=lambda item: -item[1]["last_access"]):
+            print(_format_entry(store_hash, entry))
+        total = sum(entry["size_bytes"] for entry in catalog.values())
+        print(f"{len(catalog)} stores, {total / 1e6:.1f} MB total")
+    elif args.command == "gc":
+        collect_garbage(dry_run=args.dry_run)
+    elif args.command == "vacuum":
+        for store_hash in args.store or list(scan_stores()):
+            vacuum_store(store_hash)
+    elif args.command == "remove":
+        for store_hash in args.store:
+            print(f"Removed {store_hash}: {remove_store(store_hash)} bytes freed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import hashlib
+import itertools
+import math
+import re
+
+class StubResponse:
+    def __init__(self, content):
+        self.content = content
+
+class StubCachedContent:
+    def __init__(self, name):
+        self.name = name
+
+class StubCaches:
+    """Mimics `client.caches` from google-genai, keeping cached prefixes in memory."""
+
+    def __init__(self):
+        self.contents = {}
+        self._ids = itertools.count(1)
+
+    def create(self, model, config):
+        name = f"cachedContents/stub-{next(self._ids)}"
+        self.contents[name] = "".join(part.text for content in config.contents for part in content.parts)
+        return StubCachedContent(name)
+
+class StubClient:
+    def __init__(self):
+        self.caches = StubCaches()
+
+class StubChatModel:
+    """
+    Deterministic offline replacement for ChatGoogleGenerativeAI, for running
+    the pipeline without an API key. Every call is recorded in `calls` (the
+    prompt actually sent and any cached-content handle) so prompt layout and
+    caching can be inspected.
+    """
+
+    def __init__(self, model="stub-chat"):
+        self.model = model
+        self.client = StubClient()
+        self.calls = []
+
+    def invoke(self, prompt, cached_content=None):
+        self.calls.append({"prompt": prompt, "cached_content": cached_content})
+        full_prompt = self.client.caches.contents[cached_content] + prompt if cached_content else prompt
+        return StubResponse(self._respond(full_prompt))
+
+    def _respond(self, prompt):
+        tail = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+        if tail == "Category:":
+            match = re.search(r'User Query: "(.*)"', prompt)
+            query = match.group(1).lower() if match else ""
+            general = any(w in query for w in ("summar", "overview", "main points", "purpose"))
+            return "general_query" if general else "specific_question"
+        if "Reply with exactly three lines" in prompt:
+            return "Category: specific_question\nStandalone question: \nSame topic: no"
+        if tail == "Updated summary:":
+            return "Earlier conversation about the document."
+        return f"Stub answer based on {len(prompt)} characters of prompt."
+
+class StubEmbeddings:
+    """
+    Deterministic offline embeddings using the hashing trick over lowercase
+    word tokens, so texts sharing words land close together.
+    """
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
@@ -4,11 +4,10 @@ import json
 import shutil
 import time
 
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-
 import config
+import document_loaders
 import document_processor
+import store_lifecycle
 
 def get_file_hash(filepath):
     """Calculates the MD5 hash of a file."""
@@ -18,52 +17,195 @@ def get_file_hash(filepath):
         hasher.update(buf)
     return hasher.hexdigest()
 
+def get_source_hash(path):
+    """
+    Hash identifying a document's content. For a directory it covers the
+    relative paths and contents of every supported file in it.
+    """
+    if not os.path.isdir(path):
+        return get_file_hash(path)
+    hasher = hashlib.md5()
+    with document_loaders.open_collection(path) as files:
+        for file_path, name in files:
+            hasher.update(f"{name}\0{get_file_hash(file_path)}\0".encode("utf-8"))
+    return hasher.hexdigest()
+
 def get_batch(iterable, batch_size):
     """Helper function to yield successive n-sized chunks from an iterable."""
     l = len(iterable)
     for ndx in range(0, l, batch_size):
         yield iterable[ndx:min(ndx + batch_size, l)]
 
+# Chroma and the Google client are imported on first use so that importing
+# this module stays fast.
+
+def get_embeddings():
+    """Creates the embedding model for the configured MODEL_BACKEND."""
+    if config.MODEL_BACKEND == "stub":
+        import stub_models
+        return stub_models.StubEmbeddings()
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model=config.EMBEDDING_MODEL_NAME)
+
+def open_chroma_store(persist_directory, embeddings):
+    """Opens (or creates) the Chroma store in persist_directory."""
+    from langchain_community.vectorstores import Chroma
+    return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+
+def get_persist_directory(pdf_path):
+    """Returns the vector store directory for a document, named after its hash."""
+    return os.path.join(config.VECTOR_STORE_BASE_DIR, get_source_hash(pdf_path))
+
+def _write_atomic(path, text):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+def save_full_text(pdf_path, full_text):
+    """Caches a document's extracted text in its store directory once the store is complete."""
+    persist_directory = get_persist_directory(pdf_path)
+    if store_lifecycle.is_complete_store(persist_directory):
+        _write_atomic(os.path.join(persist_directory, config.FULL_TEXT_FILENAME), full_text)
+
+def load_full_text(pdf_path, logger=print):
+    """
+    Returns the document's full text, read from the store directory when it
+    was cached by an earlier session instead of re-parsing the document.
+    """
+    cache_path = os.path.join(get_persist_directory(pdf_path), config.FULL_TEXT_FILENAME)
+    if document_loaders.is_collection(pdf_path) and not os.path.exists(cache_path):
+        # A collection is parsed once, by the store build, which caches its
+        # text; wait for (or run) that build instead of parsing it again
+        load_or_create_chroma_store(pdf_path, logger=logger)
+    if os.path.exists(cache_path):
+        logger(f"--- Loading cached text for {os.path.basename(pdf_path)} ---")
+        with open(cache_path, encoding="utf-8") as f:
+            return f.read()
+
+    logger(f"--- Extracting text from {os.path.basename(pdf_path)} ---")
+    full_text = document_processor.get_full_text(pdf_path, logger=logger)
+    save_full_text(pdf_path, full_text)
+    return full_text
+
+def _answer_cache_key():
+    return "stub" if config.MODEL_BACKEND == "stub" else config.LLM_MODEL_NAME
+
+def load_starter_answers(pdf_path):
+    """Returns the cached {question: answer} for the current chat model, or {}."""
+    cache_path = os.path.join(get_persist_directory(pdf_path), config.STARTER_ANSWERS_FILENAME)
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            return json.load(f).get(_answer_cache_key(), {})
+    except (OSError, ValueError):
+        return {}
+
+def save_starter_answers(pdf_path, answers):
+    """Caches starter answers per chat model in the store directory."""
+    persist_directory = get_persist_directory(pdf_path)
+    if not store_lifecycle.is_complete_store(persist_directory):
+        return
+    cache_path = os.path.join(persist_directory, config.STARTER_ANSWERS_FILENAME)
+    cached = {}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+    cached[_answer_cache_key()] = answers
+    _write_atomic(cache_path, json.dumps(cached, indent=2))
+
 def load_or_create_vector_store(pdf_path, logger=print):
+    """
+    Loads the vector store used for retrieval. With VECTOR_INDEX_FORMAT set to
+    "compact", a quantized memory-mapped index is exported from the Chroma
+    store once and used in its place; otherwise the Chroma store is returned.
+    """
+    persist_directory = get_persist_directory(pdf_path)
+    if config.VECTOR_INDEX_FORMAT != "compact":
+        vectordb = load_or_create_chroma_store(pdf_path, logger=logger)
+    else:
+        import compact_index
+
+        index_dir = os.path.join(persist_directory, compact_index.INDEX_DIRNAME)
+        if not compact_index.compact_index_is_current(index_dir):
+            chroma_db = load_or_create_chroma_store(pdf_path, logger=logger)
+            with store_lifecycle.build_lock(os.path.basename(persist_directory) + "-compact"):
+                if not compact_index.compact_index_is_current(index_dir):
+                    if compact_index.compact_index_exists(index_dir):
+                        logger("--- Compact index settings changed, rebuilding it ---")
+                    compact_index.rebuild_compact_index_from_chroma(chroma_db, index_dir, logger=logger)
+
+        logger(f"--- Loading compact index for {os.path.basename(pdf_path)} ---")
+        vectordb = compact_index.CompactVectorStore(index_dir, embedding_function=get_embeddings())
+
+    store_lifecycle.track_open(persist_directory, vectordb)
+    store_lifecycle.record_access(persist_directory, pdf_path)
+    return vectordb
+
+def load_or_create_chroma_store(pdf_path, logger=print):
     """
     Loads a vector store for a given PDF. If the store doesn't exist or the PDF
     has changed, it creates a new one. Uses a provided logger for output.
     """
-    embeddings = GoogleGenerativeAIEmbeddings(model=config.EMBEDDING_MODEL_NAME)
+    embeddings = get_embeddings()
     
     # Get a unique directory name from the PDF's hash
-    pdf_hash = get_file_hash(pdf_path)
-    persist_directory = os.path.join(config.VECTOR_STORE_BASE_DIR, pdf_hash)
+    persist_directory = get_persist_directory(pdf_path)
+
+    # Another thread or process may be building the same store: wait for it
+    with store_lifecycle.build_lock(os.path.basename(persist_directory)):
+        # Check if the vector store already exists
+        if store_lifecycle.is_complete_store(persist_directory):
+            logger(f"--- Loading existing vector store for {os.path.basename(pdf_path)} ---")
+            return open_chroma_store(persist_directory, embeddings)
 
-    # Check if the vector store already exists
-    if os.path.exists(persist_directory):
-        logger(f"--- Loading existing vector store for {os.path.basename(pdf_path)} ---")
-        return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+        # Holding the build lock, a directory without metadata can only be
+        # left over from an interrupted build
+        if os.path.exists(persist_directory):
+            logger(f"--- Removing incomplete vector store for {os.path.basename(pdf_path)} ---")
+            shutil.rmtree(persist_directory, ignore_errors=True)
 
-    # Create a new vector store
-    logger(f"--- Creating new vector store for {os.path.basename(pdf_path)} ---")
+        # Create a new vector store
+        logger(f"--- Creating new vector store for {os.path.basename(pdf_path)} ---")
     
-    # Ensure the base directory for vector stores exists
-    os.makedirs(persist_directory, exist_ok=True)
+        # Ensure the base directory for vector stores exists
+        os.makedirs(persist_directory, exist_ok=True)
     
-    chunks = document_processor.load_and_split_pdf(pdf_path, logger=logger)
+        chunks = document_processor.load_and_split_document(pdf_path, logger=logger)
     
-    logger("--- Creating embeddings and storing in ChromaDB (with rate limiting)... ---")
-    vectordb = Chroma(embedding_function=embeddings, persist_directory=persist_directory)
+        logger("--- Creating embeddings and storing in ChromaDB (with rate limiting)... ---")
+        vectordb = open_chroma_store(persist_directory, embeddings)
     
-    # Process chunks in batches to respect API rate limits
-    for i, batch in enumerate(get_batch(chunks, config.EMBEDDING_BATCH_SIZE)):
-        logger(f"Processing batch {i+1}/{ (len(chunks) // config.EMBEDDING_BATCH_SIZE) + 1 }...")
-        vectordb.add_documents(batch)
-        if (i + 1) * config.EMBEDDING_BATCH_SIZE < len(chunks):
-            logger(f"Waiting for {config.RATE_LIMIT_DELAY} seconds before the next batch...")
-            time.sleep(config.RATE_LIMIT_DELAY)
-
-    # Save metadata
-    metadata_path = os.path.join(persist_directory, config.METADATA_FILENAME)
-    current_pdf_hash = get_file_hash(pdf_path)
-    with open(metadata_path, 'w') as f:
-        json.dump({'hash': current_pdf_hash}, f)
+        # Process chunks in batches to respect API rate limits
+        for i, batch in enumerate(get_batch(chunks, config.EMBEDDING_BATCH_SIZE)):
+            logger(f"Processing batch {i+1}/{ (len(chunks) // config.EMBEDDING_BATCH_SIZE) + 1 }...")
+            vectordb.add_documents(batch)
+            if (i + 1) * config.EMBEDDING_BATCH_SIZE < len(chunks) and config.MODEL_BACKEND != "stub":
+                logger(f"Waiting for {config.RATE_LIMIT_DELAY} seconds before the next batch...")
+                time.sleep(config.RATE_LIMIT_DELAY)
+
+        if document_loaders.is_collection(pdf_path):
+            _write_atomic(
+                os.path.join(persist_directory, config.FULL_TEXT_FILENAME),
+                document_processor.full_text_from_chunks(chunks),
+            )
+
+        # Save metadata
+        metadata_path = os.path.join(persist_directory, config.METADATA_FILENAME)
+        current_pdf_hash = get_source_hash(pdf_path)
+        with open(metadata_path, 'w') as f:
+            json.dump({'hash': current_pdf_hash}, f)
         
-    logger("Successfully created and saved the vector store.\n")
+        logger("Successfully created and saved the vector store.\n")
+
+    # Outside the build lock, so other builds of this document are not held
+    # up while old stores are hashed and removed
+    if config.STORE_GC_ON_CREATE:
+        store_lifecycle.record_access(persist_directory, pdf_path)
+        store_lifecycle.collect_garbage(keep={os.path.basename(persist_directory)}, logger=logger)
     return vectordb
\ No newline at end of file
@@ -0,0 +1,122 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+def normalize_question(question):
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+class DocumentWarmup:
+    """
+    Prepares one document for chat in the background. Opening the vector
+    store and loading the full text start in parallel as soon as the
+    document is selected; once both are ready, the retrieval path is warmed
+    with a throwaway search and answers to STARTER_QUESTIONS are computed
+    (or read from the store's cache) before the user asks them.
+
+    Worker threads cannot write to the Streamlit UI, so without a `logger`
+    their messages are buffered until drain_logs() is called.
+    """
+
+    def __init__(self, pdf_path, llm=None, logger=None):
+        self.pdf_path = pdf_path
+        self.llm = llm
+        self._external_logger = logger
+        self._logs = []
+        self._lock = threading.Lock()
+        self._starter_answers = {}
+
+        # Two workers: store and text load in parallel; the starter task is
+        # queued behind them, so it can wait on both without blocking a worker
+        # either of them needs.
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup")
+        self._store = executor.submit(self._open_store)
+        self._text = executor.submit(self._load_text)
+        self._starters = executor.submit(self._prepare_starters) if llm and config.STARTER_QUESTIONS else None
+        executor.shutdown(wait=False)
+
+    def _log(self, message):
+        if self._external_logger:
+            self._external_logger(message)
+            return
+        with self._lock:
+            self._logs.append(message)
+
+    def drain_logs(self):
+        """Returns and clears the messages logged by the background tasks."""
+        with self._lock:
+            logs, self._logs = self._logs, []
+        return logs
+
+    def _open_store(self):
+        import vector_store_manager
+
+        vectordb = vector_store_manager.load_or_create_vector_store(self.pdf_path, logger=self._log)
+        # Loads the index into memory and opens the embedding client connection
+        try:
+            vectordb.similarity_search(os.path.basename(self.pdf_path), k=1)
+        except Exception as e:
+            self._log(f"Retrieval warm-up failed: {e}")
+        return vectordb
+
+    def _load_text(self):
+        import vector_store_manager
+
+        return vector_store_manager.load_full_text(self.pdf_path, logger=self._log)
+
+    def _prepare_starters(self):
+        import rag_handler
+        import vector_store_manager
+
+        vectordb = self._store.result()
+        full_text = self._text.result()
+        # The store may have been built after the text was extracted
+        vector_store_manager.save_full_text(self.pdf_path, full_text)
+
+        cached = vector_store_manager.load_starter_answers(self.pdf_path)
+        answers = {}
+        for question in config.STARTER_QUESTIONS:
+            if question in cached:
+                answers[question] = cached[question]
+                continue
+            self._log(f"--- Precomputing answer: {question} ---")
+            try:
+                answers[question], _ = rag_handler.get_rag_response(
+                    question, vectordb, self.llm, full_text, logger=self._log
+                )
+            except Exception as e:
+                self._log(f"Could not precompute '{question}': {e}")
+
+        with self._lock:
+            self._starter_answers.update({normalize_question(q): a for q, a in answers.items()})
+        if answers != cached:
+            vector_store_manager.save_starter_answers(self.pdf_path, answers)
+        self._log(f"Starter answers ready ({len(answers)}/{len(config.STARTER_QUESTIONS)}).")
+        return answers
+
+    def vector_store(self):
+        """The retrieval store; waits for it if it is still opening or being built."""
+        return self._store.result()
+
+    def full_text(self):
+        """The document's full text; waits for it if it is still loading."""
+        return self._text.result()
+
+    def precomputed_answer(self, question):
+        """
+        The precomputed answer if `question` is one of the STARTER_QUESTIONS.
+        Waits for the starter task if it is still running (it is doing the same
+        work the question would trigger). Returns None for any other question.
+        """
+        if self._starters is None:
+            return None
+        key = normalize_question(question)
+        if key not in {normalize_question(q) for q in config.STARTER_QUESTIONS}:
+            return None
+        try:
+            self._starters.result()
+        except Exception:
+            return None
+        with self._lock:
+            return self._starter_answers.get(key)